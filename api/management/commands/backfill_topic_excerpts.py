@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from api.models import Topic
+
+
+class Command(BaseCommand):
+    help = "Fill Topic.excerpt, content_length and reading_time for existing rows in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        last_id = 0
+        updated = 0
+        while True:
+            batch = Topic.objects.filter(pk__gt=last_id).order_by("pk").only("_id", "content")
+            topics = list(batch[:batch_size])
+            if not topics:
+                break
+
+            for topic in topics:
+                topic.fill_summary()
+            Topic.objects.bulk_update(topics, Topic.SUMMARY_FIELDS)
+            updated += len(topics)
+            last_id = topics[-1]._id
+
+        self.stdout.write(self.style.SUCCESS("Updated {} topics.".format(updated)))
@@ -0,0 +1,62 @@
+import time
+from django.conf import settings
+from django.core.handlers.base import BaseHandler
+from django.core.management.base import BaseCommand
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from django.urls import path
+from django.utils.module_loading import import_string
+from api.middleware import api_fast_path
+
+
+def noop(request):
+    return HttpResponse()
+
+
+# Requests are routed here, so that only the middleware is measured.
+urlpatterns = [path("api/bench/", noop)]
+
+
+def baseline(middleware):
+    """
+    `middleware` with the fast path subclasses replaced by their Django bases.
+    """
+    stack = []
+    for dotted in middleware:
+        cls = import_string(dotted)
+        if cls.__module__ == api_fast_path.__module__ and cls.__name__.startswith("Api"):
+            base = cls.__bases__[0]
+            dotted = "{}.{}".format(base.__module__, base.__name__)
+        stack.append(dotted)
+    return stack
+
+
+class Command(BaseCommand):
+    help = "Measure the per-request overhead of the middleware stack, with and without the API fast path."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        n = options["requests"]
+        factory = RequestFactory()
+        kinds = {
+            "bearer": {"HTTP_AUTHORIZATION": "Bearer x"},
+            "session": {"HTTP_COOKIE": "{}=x".format(settings.SESSION_COOKIE_NAME)},
+        }
+        stacks = {"django": baseline(settings.MIDDLEWARE), "fast path": settings.MIDDLEWARE}
+
+        for stack, middleware in stacks.items():
+            with override_settings(MIDDLEWARE=middleware):
+                handler = BaseHandler()
+                handler.load_middleware()
+            for kind, headers in kinds.items():
+                start = time.perf_counter()
+                for _ in range(n):
+                    request = factory.get("/api/bench/", **headers)
+                    request.urlconf = __name__
+                    handler.get_response(request)
+                elapsed = (time.perf_counter() - start) / n
+                self.stdout.write(
+                    "{:<10} {:<8} {:8.1f} us/request".format(stack, kind, elapsed * 1e6)
+                )
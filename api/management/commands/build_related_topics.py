@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from api.utils.related import build
+
+
+class Command(BaseCommand):
+    help = "Rebuild the related topics table from shared tags; run periodically."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        built = build(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS("Built related topics for {} topics.".format(built)))
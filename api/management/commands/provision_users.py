@@ -0,0 +1,41 @@
+import csv
+import json
+from django.core.management.base import BaseCommand, CommandError
+from api.utils.provision import provision_users
+
+
+class Command(BaseCommand):
+    help = "Create users in bulk from a CSV file with a header row, or a JSON array of objects."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        try:
+            with open(path, newline="") as f:
+                if path.endswith(".csv"):
+                    # Empty cells fall back to the field defaults.
+                    rows = [{k: v for k, v in row.items() if v} for row in csv.DictReader(f)]
+                else:
+                    rows = json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError("Can't read {}: {}".format(path, e))
+        if not isinstance(rows, list):
+            raise CommandError("Expected a list of users in {}.".format(path))
+
+        batch_size = options["batch_size"]
+        created = rejected = 0
+        for start in range(0, len(rows), batch_size):
+            users, errors = provision_users(rows[start : start + batch_size])
+            created += len(users)
+            rejected += len(errors)
+            for error in errors:
+                self.stderr.write(
+                    "Row {}: {}".format(start + error["index"] + 1, json.dumps(error["error"]))
+                )
+
+        self.stdout.write(
+            self.style.SUCCESS("Created {} users, rejected {}.".format(created, rejected))
+        )
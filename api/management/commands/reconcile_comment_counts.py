@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from api.models import Topic
+from api.utils.counters import reconcile_comment_counts
+
+
+class Command(BaseCommand):
+    help = "Recompute Topic.comment_count from the comment table in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        last_id = 0
+        scanned = fixed = 0
+        while True:
+            topic_ids = list(
+                Topic.objects.filter(pk__gt=last_id)
+                .order_by("pk")
+                .values_list("pk", flat=True)[:batch_size]
+            )
+            if not topic_ids:
+                break
+
+            fixed += reconcile_comment_counts(topic_ids)
+            scanned += len(topic_ids)
+            last_id = topic_ids[-1]
+
+        self.stdout.write(
+            self.style.SUCCESS("Scanned {} topics, fixed {}.".format(scanned, fixed))
+        )
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from api.models import User
+from api.utils.counters import reconcile_user_stats
+
+
+class Command(BaseCommand):
+    help = "Recompute UserStats counters from the topic, comment and favorite tables in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        last_id = 0
+        scanned = fixed = 0
+        while True:
+            user_ids = list(
+                User.objects.filter(pk__gt=last_id)
+                .order_by("pk")
+                .values_list("pk", flat=True)[:batch_size]
+            )
+            if not user_ids:
+                break
+
+            fixed += reconcile_user_stats(user_ids)
+            scanned += len(user_ids)
+            last_id = user_ids[-1]
+
+        self.stdout.write(
+            self.style.SUCCESS("Scanned {} users, fixed {}.".format(scanned, fixed))
+        )
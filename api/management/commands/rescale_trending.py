@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from api.utils.trending import rescale
+
+
+class Command(BaseCommand):
+    help = "Move the trending epoch to now and rescale stored trending scores; run periodically."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        rescaled = rescale(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS("Rescaled {} topics.".format(rescaled)))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from api.models import PurgeJob
+from api.utils.purge import run_job
+
+
+class Command(BaseCommand):
+    help = "Run or resume the purge jobs of deleted users and topics that haven't finished."
+
+    def handle(self, *args, **options):
+        jobs = PurgeJob.objects.exclude(status="done").order_by("create_at")
+        for job_id in jobs.values_list("pk", flat=True):
+            try:
+                job = run_job(job_id)
+            except Exception as e:
+                self.stderr.write("Purge job {} failed: {}".format(job_id, e))
+                continue
+
+            self.stdout.write("Purge job {} done, {} rows deleted.".format(job_id, job.deleted))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from api.utils.tasks import Worker
+
+
+class Command(BaseCommand):
+    help = "Run queued background tasks from the task table on a thread pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=4)
+        parser.add_argument("--batch-size", type=int, default=50)
+        parser.add_argument("--poll", type=float, default=1.0, help="Idle poll interval (s).")
+        parser.add_argument("--once", action="store_true", help="Drain due tasks and exit.")
+
+    def handle(self, *args, **options):
+        worker = Worker(threads=options["threads"], batch_size=options["batch_size"])
+        if options["once"]:
+            total = 0
+            while True:
+                done = worker.run_once()
+                if not done:
+                    break
+                total += done
+            self.stdout.write(self.style.SUCCESS("Ran {} tasks.".format(total)))
+            return
+
+        self.stdout.write("Worker started with {} threads.".format(options["threads"]))
+        try:
+            worker.run_forever(poll=options["poll"])
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,316 @@
+import gzip
+import re
+import threading
+import time
+from django.conf import settings
+from django.contrib.messages.middleware import MessageMiddleware
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.http import HttpResponse, JsonResponse
+from django.middleware.csrf import CsrfViewMiddleware
+from django.urls import Resolver404, resolve
+from django.utils.cache import patch_vary_headers
+from rest_framework import status
+from api.utils.cache import tiered_get, tiered_set
+from api.utils.versions import get_versions, versioned
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+# Anonymous GET responses cached with their compressed variants, by route
+# name, with the versions invalidating them. Topic details embed their
+# author, whose changes bump the versions of all their topics.
+CACHED_ROUTES = {
+    "tag-list": ("tags",),
+    "topic-detail": ("topic:{pk}",),
+    "topic-list": ("topics",),
+    "topic-trending": ("topics",),
+}
+
+# Most preferred first.
+ENCODINGS = ("br", "gzip")
+
+# Admission control route classes, by route name. Other writes are critical
+# too, other reads are normal, and long-lived streams aren't counted.
+CRITICAL_ROUTES = ("token_obtain_pair", "token_refresh")
+LOW_ROUTES = ("tag-autocomplete", "tag-list", "topic-related", "user-list")
+EXEMPT_ROUTES = ("topic-events",)
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+# Bearer requests under API_PREFIX skip the session, CSRF and message
+# middleware, except under the browsable API's login views.
+API_PREFIX = "/api/"
+API_SESSION_PREFIXES = ("/api/auth/",)
+
+ACCEPT_ENCODING = re.compile(r"\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([\d.]+))?")
+
+
+def accepted_encodings(header):
+    accepted = set()
+    for part in (header or "").split(","):
+        match = ACCEPT_ENCODING.match(part)
+        if match is None:
+            continue
+        try:
+            q = float(match.group(2) or 1)
+        except ValueError:
+            continue
+        if q > 0:
+            accepted.add(match.group(1).lower())
+    return accepted
+
+
+def compress(content):
+    """
+    The identity, gzip and, when available, brotli variants of `content`.
+    Bodies under CONDUIT_COMPRESS_MIN_SIZE bytes are only kept as is.
+    """
+    variants = {"identity": content}
+    if len(content) < getattr(settings, "CONDUIT_COMPRESS_MIN_SIZE", 1024):
+        return variants
+
+    variants["gzip"] = gzip.compress(content, compresslevel=6)
+    if brotli is not None:
+        variants["br"] = brotli.compress(content)
+    return variants
+
+
+class ResponseCacheMiddleware(object):
+    """
+    Serve anonymous GET requests of the routes in CACHED_ROUTES from a
+    response cache keyed on the URL, the `Accept` header and the versions of
+    what the response shows. Each entry holds the body compressed once per
+    encoding when it's filled, and the variant matching `Accept-Encoding` is
+    served, so hits cost neither serialization nor compression.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        key = getattr(request, "_response_cache_key", None)
+        if key is None or response.status_code != 200 or response.streaming:
+            return response
+        data = getattr(response, "data", None)
+        if isinstance(data, dict) and data.get("code", 200) != 200:
+            return response
+        if not response.get("Content-Type", "").startswith("application/json"):
+            return response
+
+        entry = {
+            "content_type": response["Content-Type"],
+            "variants": compress(response.content),
+        }
+        tiered_set({key: entry}, getattr(settings, "CONDUIT_RESPONSE_CACHE_TIMEOUT", 60))
+        return self.serve(request, entry, response)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method != "GET" or not self.anonymous(request):
+            return None
+
+        match = request.resolver_match
+        names = CACHED_ROUTES.get(match.url_name)
+        if names is None:
+            return None
+
+        names = [name.format(**match.kwargs) for name in names]
+        versions = get_versions(names)
+        key = versioned(
+            "response:{}:{}".format(request.build_absolute_uri(), request.META.get("HTTP_ACCEPT")),
+            ",".join(str(versions[name]) for name in names),
+        )
+        entry = tiered_get([key]).get(key)
+        if entry is None:
+            request._response_cache_key = key
+            return None
+        return self.serve(request, entry)
+
+    def anonymous(self, request):
+        return (
+            "HTTP_AUTHORIZATION" not in request.META
+            and settings.SESSION_COOKIE_NAME not in request.COOKIES
+        )
+
+    def serve(self, request, entry, response=None):
+        accepted = accepted_encodings(request.META.get("HTTP_ACCEPT_ENCODING"))
+        variants = entry["variants"]
+        encoding = next((e for e in ENCODINGS if e in accepted and e in variants), None)
+        if response is None or encoding is not None:
+            response = HttpResponse(
+                variants[encoding or "identity"], content_type=entry["content_type"]
+            )
+            if encoding is not None:
+                response["Content-Encoding"] = encoding
+            response["Content-Length"] = str(len(response.content))
+        patch_vary_headers(response, ("Accept", "Accept-Encoding"))
+        return response
+
+
+class RouteClass(object):
+    """
+    In-flight count and latency of one route class. The latency is an
+    exponentially weighted moving average that also decays while no request
+    completes, so a class that stopped being admitted recovers.
+    """
+
+    def __init__(self):
+        self.inflight = 0
+        self._latency = 0.0
+        self._updated = time.monotonic()
+
+    def latency(self, now):
+        half_life = getattr(settings, "CONDUIT_ADMISSION_LATENCY_DECAY", 10)
+        return self._latency * 0.5 ** ((now - self._updated) / half_life)
+
+    def record(self, elapsed, now):
+        self._latency = 0.8 * self.latency(now) + 0.2 * elapsed
+        self._updated = now
+
+
+class AdmissionControlMiddleware(object):
+    """
+    Shed load before it queues up behind the database. Every request is
+    classed as critical (logins and writes), normal or low priority (user
+    and tag lists, related topics, pages past CONDUIT_ADMISSION_DEEP_PAGE).
+    A class at its CONDUIT_ADMISSION_MAX_INFLIGHT limit gets fast 503s, and
+    low-priority requests get 429s while the normal class is slower than
+    CONDUIT_ADMISSION_MAX_LATENCY seconds. Keep the normal and low limits
+    under the worker count so that logins and writes always find capacity.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.classes = {"critical": RouteClass(), "low": RouteClass(), "normal": RouteClass()}
+        self._lock = threading.Lock()
+
+    def __call__(self, request):
+        route = self.classify(request)
+        if route is None:
+            return self.get_response(request)
+
+        rejected = self.admit(route)
+        if rejected is not None:
+            return self.reject(rejected)
+
+        start = time.monotonic()
+        try:
+            return self.get_response(request)
+        finally:
+            now = time.monotonic()
+            with self._lock:
+                self.classes[route].inflight -= 1
+                self.classes[route].record(now - start, now)
+
+    def classify(self, request):
+        try:
+            name = resolve(request.path_info).url_name
+        except Resolver404:
+            return "normal"
+
+        if name in EXEMPT_ROUTES:
+            return None
+        if name in CRITICAL_ROUTES or request.method not in SAFE_METHODS:
+            return "critical"
+        if name in LOW_ROUTES:
+            return "low"
+        try:
+            page = int(request.GET.get("page", 1))
+        except ValueError:
+            page = 1
+        if page > getattr(settings, "CONDUIT_ADMISSION_DEEP_PAGE", 20):
+            return "low"
+        return "normal"
+
+    def admit(self, route):
+        """
+        Count the request in, or return the status to reject it with.
+        """
+        limit = getattr(settings, "CONDUIT_ADMISSION_MAX_INFLIGHT", {}).get(route)
+        max_latency = getattr(settings, "CONDUIT_ADMISSION_MAX_LATENCY", 2.0)
+        now = time.monotonic()
+        with self._lock:
+            if limit is not None and self.classes[route].inflight >= limit:
+                return status.HTTP_503_SERVICE_UNAVAILABLE
+            if route == "low" and self.classes["normal"].latency(now) > max_latency:
+                return status.HTTP_429_TOO_MANY_REQUESTS
+            self.classes[route].inflight += 1
+        return None
+
+    def reject(self, code):
+        response = JsonResponse({"code": code, "msg": "Server busy, retry later."}, status=code)
+        response["Retry-After"] = str(getattr(settings, "CONDUIT_ADMISSION_RETRY_AFTER", 5))
+        return response
+
+
+def api_fast_path(request):
+    """
+    Whether the request is an API call authenticated with a bearer token,
+    which needs neither a session nor CSRF protection.
+    """
+    fast = getattr(request, "_api_fast_path", None)
+    if fast is None:
+        path = request.path_info
+        fast = (
+            getattr(settings, "CONDUIT_API_FAST_PATH", True)
+            and path.startswith(API_PREFIX)
+            and not path.startswith(API_SESSION_PREFIXES)
+            and request.META.get("HTTP_AUTHORIZATION", "").startswith("Bearer ")
+        )
+        request._api_fast_path = fast
+    return fast
+
+
+class ApiSessionMiddleware(SessionMiddleware):
+    """
+    SessionMiddleware giving fast path requests an empty session that is
+    never loaded nor saved.
+    """
+
+    def process_request(self, request):
+        if api_fast_path(request):
+            request.session = self.SessionStore()
+            return
+        super().process_request(request)
+
+    def process_response(self, request, response):
+        if api_fast_path(request):
+            return response
+        return super().process_response(request, response)
+
+
+class ApiCsrfViewMiddleware(CsrfViewMiddleware):
+    """
+    CsrfViewMiddleware skipping fast path requests, which carry no cookie to
+    forge a request with.
+    """
+
+    def process_request(self, request):
+        if not api_fast_path(request):
+            super().process_request(request)
+
+    def process_view(self, request, callback, callback_args, callback_kwargs):
+        if api_fast_path(request):
+            return None
+        return super().process_view(request, callback, callback_args, callback_kwargs)
+
+    def process_response(self, request, response):
+        if api_fast_path(request):
+            return response
+        return super().process_response(request, response)
+
+
+class ApiMessageMiddleware(MessageMiddleware):
+    """
+    MessageMiddleware skipping fast path requests, which show no messages.
+    """
+
+    def process_request(self, request):
+        if not api_fast_path(request):
+            super().process_request(request)
+
+    def process_response(self, request, response):
+        if api_fast_path(request):
+            return response
+        return super().process_response(request, response)
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 15:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_remove_user_date_joined_remove_user_first_name_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='topic',
+            name='comment_count',
+            field=models.IntegerField(default=0, verbose_name='comment count'),
+        ),
+    ]
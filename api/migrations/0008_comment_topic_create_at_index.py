@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-19 15:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_topic_comment_count'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['topic', '-create_at'], name='api_comment_topic_i_ed15b7_idx'),
+        ),
+    ]
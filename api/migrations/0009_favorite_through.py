@@ -0,0 +1,92 @@
+# Generated by Django 4.2.30 on 2026-10-19 15:20
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+BATCH_SIZE = 1000
+
+
+def copy_favorites(apps, schema_editor):
+    """Copy the auto-created user/topic pairs into the Favorite table in batches."""
+    User = apps.get_model("api", "User")
+    Favorite = apps.get_model("api", "Favorite")
+    Through = User._meta.get_field("favorites").remote_field.through
+
+    last_id = 0
+    while True:
+        rows = list(
+            Through.objects.filter(pk__gt=last_id)
+            .order_by("pk")
+            .values_list("pk", "user_id", "topic_id")[:BATCH_SIZE]
+        )
+        if not rows:
+            break
+
+        Favorite.objects.bulk_create(
+            [Favorite(user_id=user_id, topic_id=topic_id) for _, user_id, topic_id in rows],
+            ignore_conflicts=True,
+        )
+        last_id = rows[-1][0]
+
+
+def restore_favorites(apps, schema_editor):
+    """Copy the Favorite rows back into the auto-created table in batches."""
+    User = apps.get_model("api", "User")
+    Favorite = apps.get_model("api", "Favorite")
+    Through = User._meta.get_field("favorites").remote_field.through
+
+    last_id = 0
+    while True:
+        rows = list(
+            Favorite.objects.filter(pk__gt=last_id)
+            .order_by("pk")
+            .values_list("pk", "user_id", "topic_id")[:BATCH_SIZE]
+        )
+        if not rows:
+            break
+
+        Through.objects.bulk_create(
+            [Through(user_id=user_id, topic_id=topic_id) for _, user_id, topic_id in rows],
+            ignore_conflicts=True,
+        )
+        last_id = rows[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_comment_topic_create_at_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Favorite',
+            fields=[
+                ('_id', models.AutoField(primary_key=True, serialize=False, verbose_name='id')),
+                ('create_at', models.DateTimeField(auto_now_add=True, verbose_name='create at')),
+                ('topic', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='favorited_by', to='api.topic')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='favorite',
+            index=models.Index(fields=['user', '-create_at'], name='api_favorit_user_id_83258a_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='favorite',
+            constraint=models.UniqueConstraint(fields=('user', 'topic'), name='unique_user_topic_favorite'),
+        ),
+        migrations.RunPython(copy_favorites, restore_favorites),
+        # Django can't add `through=` to an existing M2M, so the field is
+        # recreated on top of the Favorite table once the rows are copied.
+        migrations.RemoveField(
+            model_name='user',
+            name='favorites',
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='favorites',
+            field=models.ManyToManyField(blank=True, related_name='user_favorites', through='api.Favorite', to='api.topic'),
+        ),
+    ]
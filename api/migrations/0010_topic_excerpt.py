@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-19 15:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_favorite_through'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='topic',
+            name='content_length',
+            field=models.IntegerField(default=0, verbose_name='content length'),
+        ),
+        migrations.AddField(
+            model_name='topic',
+            name='excerpt',
+            field=models.CharField(default='', max_length=256, verbose_name='excerpt'),
+        ),
+        migrations.AddField(
+            model_name='topic',
+            name='reading_time',
+            field=models.SmallIntegerField(default=1, verbose_name='reading time'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 4.2.30 on 2026-10-19 15:25
+
+import api.models
+from django.conf import settings
+import django.contrib.auth.models
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_topic_excerpt'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='user',
+            managers=[
+                ('objects', api.models.LiveUserManager()),
+                ('all_objects', django.contrib.auth.models.UserManager()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='topic',
+            name='delete_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='delete at'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='delete_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='delete at'),
+        ),
+        migrations.CreateModel(
+            name='PurgeJob',
+            fields=[
+                ('_id', models.AutoField(primary_key=True, serialize=False, verbose_name='id')),
+                ('create_at', models.DateTimeField(auto_now_add=True, verbose_name='create at')),
+                ('deleted', models.IntegerField(default=0, verbose_name='deleted rows')),
+                ('error', models.TextField(blank=True, default='', verbose_name='error')),
+                ('kind', models.CharField(choices=[('topic', 'Topic'), ('user', 'User')], max_length=16, verbose_name='kind')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=16, verbose_name='status')),
+                ('target_id', models.IntegerField(verbose_name='target id')),
+                ('update_at', models.DateTimeField(auto_now=True, null=True, verbose_name='update at')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'create_at'], name='api_purgejo_status_fe5913_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-19 15:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_soft_delete_purge_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Task',
+            fields=[
+                ('_id', models.AutoField(primary_key=True, serialize=False, verbose_name='id')),
+                ('attempts', models.SmallIntegerField(default=0, verbose_name='attempts')),
+                ('create_at', models.DateTimeField(auto_now_add=True, verbose_name='create at')),
+                ('error', models.TextField(blank=True, default='', verbose_name='error')),
+                ('key', models.CharField(blank=True, max_length=128, null=True, unique=True, verbose_name='idempotency key')),
+                ('kind', models.CharField(max_length=64, verbose_name='kind')),
+                ('locked_at', models.DateTimeField(blank=True, null=True, verbose_name='locked at')),
+                ('locked_by', models.CharField(blank=True, default='', max_length=32, verbose_name='locked by')),
+                ('max_attempts', models.SmallIntegerField(default=5, verbose_name='max attempts')),
+                ('payload', models.JSONField(default=dict, verbose_name='payload')),
+                ('run_at', models.DateTimeField(verbose_name='run at')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=16, verbose_name='status')),
+                ('update_at', models.DateTimeField(auto_now=True, null=True, verbose_name='update at')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'run_at'], name='api_task_status_43794d_idx'), models.Index(fields=['locked_by'], name='api_task_locked__edc639_idx')],
+            },
+        ),
+    ]
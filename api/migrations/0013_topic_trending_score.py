@@ -0,0 +1,30 @@
+# Generated by Django 4.2.30 on 2026-10-19 15:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_task'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingEpoch',
+            fields=[
+                ('_id', models.AutoField(primary_key=True, serialize=False, verbose_name='id')),
+                ('create_at', models.DateTimeField(auto_now_add=True, verbose_name='create at')),
+                ('epoch', models.DateTimeField(verbose_name='epoch')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='topic',
+            name='trending_score',
+            field=models.FloatField(default=0, verbose_name='trending score'),
+        ),
+        migrations.AddIndex(
+            model_name='topic',
+            index=models.Index(fields=['-trending_score'], name='api_topic_trendin_629f10_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.30 on 2026-10-19 15:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_topic_trending_score'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedTopic',
+            fields=[
+                ('_id', models.AutoField(primary_key=True, serialize=False, verbose_name='id')),
+                ('score', models.FloatField(verbose_name='score')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_to_links', to='api.topic')),
+                ('topic', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_links', to='api.topic')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['topic', '-score'], name='api_related_topic_i_8a1f59_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='relatedtopic',
+            constraint=models.UniqueConstraint(fields=('topic', 'related'), name='unique_related_topic'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.30 on 2026-10-19 15:33
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_related_topic'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('_id', models.AutoField(primary_key=True, serialize=False, verbose_name='id')),
+                ('comment_count', models.IntegerField(default=0, verbose_name='comment count')),
+                ('favorites_given', models.IntegerField(default=0, verbose_name='favorites given')),
+                ('favorites_received', models.IntegerField(default=0, verbose_name='favorites received')),
+                ('last_active', models.DateTimeField(blank=True, null=True, verbose_name='last active')),
+                ('topic_count', models.IntegerField(default=0, verbose_name='topic count')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-19 15:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_user_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CacheVersion',
+            fields=[
+                ('_id', models.AutoField(primary_key=True, serialize=False, verbose_name='id')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='name')),
+                ('version', models.BigIntegerField(default=0, verbose_name='version')),
+            ],
+        ),
+    ]
@@ -1,5 +1,33 @@
 from django.db import models
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager
+from api.utils.text import make_excerpt, reading_time
+
+
+class LiveUserManager(UserManager):
+    """Hide users waiting to be purged."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(delete_at__isnull=True)
+
+
+class LiveTopicManager(models.Manager):
+    """Hide deleted topics and the topics of deleted users."""
+
+    def get_queryset(self):
+        return (
+            super().get_queryset().filter(delete_at__isnull=True, user__delete_at__isnull=True)
+        )
+
+
+class LiveCommentManager(models.Manager):
+    """Hide the comments of deleted topics and deleted users."""
+
+    def get_queryset(self):
+        return (
+            super()
+            .get_queryset()
+            .filter(topic__delete_at__isnull=True, user__delete_at__isnull=True)
+        )
 
 
 class User(AbstractUser):
@@ -13,8 +41,11 @@ class User(AbstractUser):
     bio = models.TextField("bio", default="")
     birthday = models.CharField("birthday", max_length=64, default="")
     create_at = models.DateTimeField("create at", auto_now_add=True)
+    delete_at = models.DateTimeField("delete at", null=True, blank=True)
     email = models.EmailField("e-mail", max_length=128, unique=True)
-    favorites = models.ManyToManyField(to="Topic", related_name="user_favorites", blank=True)
+    favorites = models.ManyToManyField(
+        to="Topic", through="Favorite", related_name="user_favorites", blank=True
+    )
     gender_choices = (
         (-1, "Secret"),
         (0, "Female"),
@@ -35,6 +66,9 @@ class User(AbstractUser):
     #     to="Department", to_field="id", null=True, blank=True, on_delete=models.SET_NULL
     # )
 
+    objects = LiveUserManager()
+    all_objects = UserManager()
+
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = ["username"]
 
@@ -51,22 +85,48 @@ class Topic(models.Model):
     """Topic Table"""
 
     _id = models.AutoField("id", primary_key=True)
+    comment_count = models.IntegerField("comment count", default=0)
     content = models.TextField("content")
+    content_length = models.IntegerField("content length", default=0)
     create_at = models.DateTimeField("create at", auto_now_add=True)
+    delete_at = models.DateTimeField("delete at", null=True, blank=True)
+    excerpt = models.CharField("excerpt", max_length=256, default="")
     favorite = models.IntegerField("favorite", default=0)
+    reading_time = models.SmallIntegerField("reading time", default=1)
     tags = models.ManyToManyField(to="Tag", related_name="topic_tags", blank=True)
     title = models.TextField("title")
+    trending_score = models.FloatField("trending score", default=0)
     update_at = models.DateTimeField("update at", null=True, blank=True, auto_now=True)
     user = models.ForeignKey(to="User", to_field="_id", on_delete=models.CASCADE)
 
+    objects = LiveTopicManager()
+    all_objects = models.Manager()
+
     class Meta:
         indexes = [
             models.Index(fields=["-create_at"]),
+            models.Index(fields=["-trending_score"]),
         ]
 
+    SUMMARY_FIELDS = ("content_length", "excerpt", "reading_time")
+
     def __str__(self) -> str:
         return self.title
 
+    def save(self, *args, **kwargs):
+        if "content" not in self.get_deferred_fields():
+            self.fill_summary()
+            update_fields = kwargs.get("update_fields")
+            if update_fields is not None and "content" in update_fields:
+                kwargs["update_fields"] = {*update_fields, *self.SUMMARY_FIELDS}
+        super().save(*args, **kwargs)
+
+    def fill_summary(self):
+        """Derive the list-page summary columns from `content`."""
+        self.content_length = len(self.content)
+        self.excerpt = make_excerpt(self.content)
+        self.reading_time = reading_time(self.content)
+
 
 class Tag(models.Model):
     """Tag Table"""
@@ -95,10 +155,168 @@ class Comment(models.Model):
     )
     user = models.ForeignKey(to="User", to_field="_id", on_delete=models.CASCADE)
 
+    objects = LiveCommentManager()
+    all_objects = models.Manager()
+
     class Meta:
         indexes = [
             models.Index(fields=["-create_at"]),
+            models.Index(fields=["topic", "-create_at"]),
         ]
 
     def __str__(self) -> str:
         return self.content
+
+
+class Favorite(models.Model):
+    """Favorite Table"""
+
+    _id = models.AutoField("id", primary_key=True)
+    create_at = models.DateTimeField("create at", auto_now_add=True)
+    topic = models.ForeignKey(
+        to="Topic", to_field="_id", related_name="favorited_by", on_delete=models.CASCADE
+    )
+    user = models.ForeignKey(to="User", to_field="_id", on_delete=models.CASCADE)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "topic"], name="unique_user_topic_favorite"),
+        ]
+        indexes = [
+            models.Index(fields=["user", "-create_at"]),
+        ]
+
+    def __str__(self) -> str:
+        return "{} -> {}".format(self.user_id, self.topic_id)
+
+
+class PurgeJob(models.Model):
+    """Purge Job Table"""
+
+    _id = models.AutoField("id", primary_key=True)
+    create_at = models.DateTimeField("create at", auto_now_add=True)
+    deleted = models.IntegerField("deleted rows", default=0)
+    error = models.TextField("error", default="", blank=True)
+    kind_choices = (
+        ("topic", "Topic"),
+        ("user", "User"),
+    )
+    kind = models.CharField("kind", max_length=16, choices=kind_choices)
+    status_choices = (
+        ("pending", "Pending"),
+        ("running", "Running"),
+        ("done", "Done"),
+        ("failed", "Failed"),
+    )
+    status = models.CharField("status", max_length=16, choices=status_choices, default="pending")
+    target_id = models.IntegerField("target id")
+    update_at = models.DateTimeField("update at", null=True, blank=True, auto_now=True)
+    user = models.ForeignKey(
+        to="User", to_field="_id", null=True, blank=True, on_delete=models.SET_NULL
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "create_at"]),
+        ]
+
+    def __str__(self) -> str:
+        return "{} {} ({})".format(self.kind, self.target_id, self.status)
+
+
+class Task(models.Model):
+    """Task Table"""
+
+    _id = models.AutoField("id", primary_key=True)
+    attempts = models.SmallIntegerField("attempts", default=0)
+    create_at = models.DateTimeField("create at", auto_now_add=True)
+    error = models.TextField("error", default="", blank=True)
+    key = models.CharField("idempotency key", max_length=128, null=True, blank=True, unique=True)
+    kind = models.CharField("kind", max_length=64)
+    locked_at = models.DateTimeField("locked at", null=True, blank=True)
+    locked_by = models.CharField("locked by", max_length=32, default="", blank=True)
+    max_attempts = models.SmallIntegerField("max attempts", default=5)
+    payload = models.JSONField("payload", default=dict)
+    run_at = models.DateTimeField("run at")
+    status_choices = (
+        ("pending", "Pending"),
+        ("running", "Running"),
+        ("done", "Done"),
+        ("failed", "Failed"),
+    )
+    status = models.CharField("status", max_length=16, choices=status_choices, default="pending")
+    update_at = models.DateTimeField("update at", null=True, blank=True, auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "run_at"]),
+            models.Index(fields=["locked_by"]),
+        ]
+
+    def __str__(self) -> str:
+        return "{} #{} ({})".format(self.kind, self._id, self.status)
+
+
+class TrendingEpoch(models.Model):
+    """Trending Epoch Table"""
+
+    _id = models.AutoField("id", primary_key=True)
+    create_at = models.DateTimeField("create at", auto_now_add=True)
+    epoch = models.DateTimeField("epoch")
+
+    def __str__(self) -> str:
+        return self.epoch.isoformat()
+
+
+class RelatedTopic(models.Model):
+    """Related Topic Table"""
+
+    _id = models.AutoField("id", primary_key=True)
+    related = models.ForeignKey(
+        to="Topic", to_field="_id", related_name="related_to_links", on_delete=models.CASCADE
+    )
+    score = models.FloatField("score")
+    topic = models.ForeignKey(
+        to="Topic", to_field="_id", related_name="related_links", on_delete=models.CASCADE
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["topic", "related"], name="unique_related_topic"),
+        ]
+        indexes = [
+            models.Index(fields=["topic", "-score"]),
+        ]
+
+    def __str__(self) -> str:
+        return "{} ~ {}".format(self.topic_id, self.related_id)
+
+
+class UserStats(models.Model):
+    """User Stats Table"""
+
+    _id = models.AutoField("id", primary_key=True)
+    comment_count = models.IntegerField("comment count", default=0)
+    favorites_given = models.IntegerField("favorites given", default=0)
+    favorites_received = models.IntegerField("favorites received", default=0)
+    last_active = models.DateTimeField("last active", null=True, blank=True)
+    topic_count = models.IntegerField("topic count", default=0)
+    user = models.OneToOneField(
+        to="User", to_field="_id", related_name="stats", on_delete=models.CASCADE
+    )
+
+    COUNTERS = ("comment_count", "favorites_given", "favorites_received", "topic_count")
+
+    def __str__(self) -> str:
+        return str(self.user_id)
+
+
+class CacheVersion(models.Model):
+    """Cache Version Table"""
+
+    _id = models.AutoField("id", primary_key=True)
+    name = models.CharField("name", max_length=255, unique=True)
+    version = models.BigIntegerField("version", default=0)
+
+    def __str__(self) -> str:
+        return "{}@{}".format(self.name, self.version)
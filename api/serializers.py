@@ -1,14 +1,19 @@
 from typing import Any, Dict
+from django.utils.functional import SimpleLazyObject
 from rest_framework.serializers import (
     CharField,
     ModelSerializer,
     PrimaryKeyRelatedField,
+    SerializerMethodField,
     StringRelatedField,
     ValidationError,
 )
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
-from api.models import Comment, Tag, Topic, User
+from api.models import Comment, Favorite, PurgeJob, Tag, Topic, User, UserStats
+from api.utils.fieldsets import SparseFieldsetMixin
 from api.utils.hook import HookSerializer
+from api.utils.passwords import hash_password
+from api.utils.render import MarkdownField
 
 
 class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
@@ -29,13 +34,24 @@ class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
         return res
 
 
-class UserReadSerializer(HookSerializer, ModelSerializer):
+class UserStatsSerializer(SparseFieldsetMixin, ModelSerializer):
+    class Meta:
+        model = UserStats
+        exclude = ["_id", "user"]
+        extra_kwargs = {
+            "last_active": {"format": "%Y-%m-%d %H:%M:%S"},
+        }
+
+
+class UserReadSerializer(SparseFieldsetMixin, HookSerializer, ModelSerializer):
     favorites = PrimaryKeyRelatedField(many=True, read_only=True)
+    stats = UserStatsSerializer(read_only=True)
 
     class Meta:
         model = User
         # fields = "__all__"
         exclude = [
+            "delete_at",
             "groups",
             "is_staff",
             "is_superuser",
@@ -52,6 +68,32 @@ class UserReadSerializer(HookSerializer, ModelSerializer):
         return obj.get_gender_display()
 
 
+class UserProvisionSerializer(ModelSerializer):
+    """
+    A row of a bulk user creation. Uniqueness is checked for the whole batch
+    by `provision_users` instead of once per row.
+    """
+
+    class Meta:
+        model = User
+        fields = [
+            "avatar",
+            "bio",
+            "birthday",
+            "email",
+            "gender",
+            "job",
+            "nickname",
+            "password",
+            "phone",
+            "username",
+        ]
+        extra_kwargs = {
+            "email": {"validators": []},
+            "username": {"validators": []},
+        }
+
+
 class UserWriteSerializer(ModelSerializer):
     confirm_password = CharField(max_length=128)
 
@@ -59,6 +101,7 @@ class UserWriteSerializer(ModelSerializer):
         model = User
         fields = "__all__"
         extra_kwargs = {
+            "delete_at": {"read_only": True},
             "is_staff": {"read_only": True},
         }
 
@@ -67,7 +110,7 @@ class UserWriteSerializer(ModelSerializer):
             if self.instance.email != value:
                 raise ValidationError("E-mail can't be changed.")
         else:
-            if User.objects.filter(email=value).exists():
+            if User.all_objects.filter(email=value).exists():
                 raise ValidationError("E-mail already exists.")
         return value
 
@@ -76,7 +119,7 @@ class UserWriteSerializer(ModelSerializer):
             if self.instance.username != value:
                 raise ValidationError("Username can't be changed.")
         else:
-            if User.objects.filter(username=value).exists():
+            if User.all_objects.filter(username=value).exists():
                 raise ValidationError("Username already exists.")
         return value
 
@@ -87,13 +130,17 @@ class UserWriteSerializer(ModelSerializer):
 
     def create(self, validated_data):
         validated_data.pop("confirm_password")
-        user = super().create(validated_data)
-        user.set_password(validated_data["password"])
-        user.save()
-        return user
+        validated_data["password"] = hash_password(validated_data["password"])
+        return super().create(validated_data)
+
+    def update(self, instance, validated_data):
+        validated_data.pop("confirm_password", None)
+        if "password" in validated_data:
+            validated_data["password"] = hash_password(validated_data["password"])
+        return super().update(instance, validated_data)
 
 
-class TagSerializer(ModelSerializer):
+class TagSerializer(SparseFieldsetMixin, ModelSerializer):
     class Meta:
         model = Tag
         fields = "__all__"
@@ -102,9 +149,12 @@ class TagSerializer(ModelSerializer):
         }
 
 
-class CommentReadSerializer(ModelSerializer):
+class CommentReadSerializer(SparseFieldsetMixin, ModelSerializer):
+    content_html = MarkdownField(source="content")
     user = UserReadSerializer()
 
+    optional_fields = ("content_html",)
+
     class Meta:
         model = Comment
         fields = "__all__"
@@ -120,13 +170,60 @@ class CommentWriteSerializer(ModelSerializer):
         fields = "__all__"
 
 
-class TopicReadSerializer(ModelSerializer):
+def favorited_ids(request, topic_ids):
+    """
+    The subset of `topic_ids` favorited by the current user, in one query.
+    """
+    user = getattr(request, "user", None)
+    if user is None or not user.is_authenticated:
+        return frozenset()
+
+    favorites = Favorite.objects.filter(user=user._id, topic__in=topic_ids)
+    return frozenset(favorites.values_list("topic", flat=True))
+
+
+def favorited_context(request, topics):
+    """
+    Serializer context carrying the ids of the given topics that the current
+    user has favorited, looked up with a single query for the whole page.
+    The query is deferred until the first topic renders `favorited`, so it is
+    skipped entirely when the field is omitted.
+    """
+    return {
+        "favorited_ids": SimpleLazyObject(
+            lambda: favorited_ids(request, [topic._id for topic in topics])
+        )
+    }
+
+
+class TopicReadSerializer(SparseFieldsetMixin, ModelSerializer):
     comments = CommentReadSerializer(many=True, read_only=True)
+    content_html = MarkdownField(source="content")
+    favorited = SerializerMethodField()
     tags = StringRelatedField(many=True)
     user = UserReadSerializer()
 
+    optional_fields = ("content_html",)
+
     class Meta:
         model = Topic
+        exclude = ["delete_at", "trending_score"]
+        extra_kwargs = {
+            "comment_count": {"read_only": True},
+            "content_length": {"read_only": True},
+            "create_at": {"format": "%Y-%m-%d %H:%M:%S", "read_only": True},
+            "excerpt": {"read_only": True},
+            "reading_time": {"read_only": True},
+            "update_at": {"format": "%Y-%m-%d %H:%M:%S", "read_only": True},
+        }
+
+    def get_favorited(self, obj):
+        return obj._id in self.context.get("favorited_ids", ())
+
+
+class PurgeJobSerializer(ModelSerializer):
+    class Meta:
+        model = PurgeJob
         fields = "__all__"
         extra_kwargs = {
             "create_at": {"format": "%Y-%m-%d %H:%M:%S", "read_only": True},
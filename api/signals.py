@@ -0,0 +1,39 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_save, pre_delete
+from django.dispatch import receiver
+from api.models import Comment, Tag, Topic, User, UserStats
+from api.utils.autocomplete import tag_index
+from api.utils.counters import release_comment_counts
+from api.utils.versions import increment
+
+
+@receiver(pre_delete, sender=User)
+def release_user_comments(sender, instance, **kwargs):
+    # The user's own topics are about to go away together with their comments,
+    # only the counters of other people's topics need to be kept in sync.
+    comments = Comment.objects.filter(user=instance).exclude(topic__user=instance)
+    release_comment_counts(comments)
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.objects.create(user=instance)
+
+
+@receiver(post_save, sender=Tag)
+def index_tag(sender, instance, created, **kwargs):
+    if created:
+        name = instance.tag
+        # Like bump("tags"), but the new version tells the index whether
+        # another writer came in between.
+        transaction.on_commit(lambda: tag_index.add(name, version=increment("tags")))
+
+
+@receiver(m2m_changed, sender=Topic.tags.through)
+def count_tag_usage(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse or not pk_set or tag_index.built_at is None:
+        return
+    if action in ("post_add", "post_remove"):
+        names = Tag.objects.filter(pk__in=pk_set).values_list("tag", flat=True)
+        tag_index.use(names, 1 if action == "post_add" else -1)
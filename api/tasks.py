@@ -0,0 +1,35 @@
+from api.models import Comment, Topic
+from api.utils.purge import run_job
+from api.utils.related import refresh
+from api.utils.render import prerender_markdown
+from api.utils.tasks import task
+from api.utils.trending import rescale
+
+
+@task("purge", max_attempts=10)
+def purge(payload):
+    run_job(payload["job"])
+
+
+@task("prerender_topics", batch=True)
+def prerender_topics(payloads):
+    topic_ids = {p["topic"] for p in payloads}
+    for content in Topic.objects.filter(pk__in=topic_ids).values_list("content", flat=True):
+        prerender_markdown(content)
+
+
+@task("prerender_comments", batch=True)
+def prerender_comments(payloads):
+    comment_ids = {p["comment"] for p in payloads}
+    for content in Comment.objects.filter(pk__in=comment_ids).values_list("content", flat=True):
+        prerender_markdown(content)
+
+
+@task("rescale_trending")
+def rescale_trending(payload):
+    rescale()
+
+
+@task("refresh_related", batch=True)
+def refresh_related(payloads):
+    refresh({p["topic"] for p in payloads})
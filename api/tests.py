@@ -1,3 +1,1151 @@
-from django.test import TestCase
+import asyncio
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import check_password, make_password
+from django.core.management import call_command
+from django.db import connection, connections
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from api.models import (
+    CacheVersion,
+    Comment,
+    Favorite,
+    PurgeJob,
+    Tag,
+    Task,
+    Topic,
+    TrendingEpoch,
+    User,
+    UserStats,
+)
+from api.serializers import TopicReadSerializer
+from api.middleware import (
+    AdmissionControlMiddleware,
+    ApiCsrfViewMiddleware,
+    ApiSessionMiddleware,
+    api_fast_path,
+)
+from api.utils.autocomplete import TagIndex, tag_index
+from api.utils.cache import STALE_KEY, TOPIC_KEY, load_topics, local_cache
+from api.utils.coalesce import LEASE_KEY
+from api.utils.hashers import timed_make
+from api.utils.passwords import PasswordPool, PasswordPoolBusy, password_pool
+from api.utils.pubsub import CacheBroker
+from api.utils.purge import run_job
+from api.utils.related import build, refresh
+from api.utils.render import content_key, local_cache as render_cache, render_markdown
+from api.utils.tasks import Worker, enqueue, registry, task
+from api.utils.versions import VERSION_KEY, get_version, get_versions, increment, versioned
 
-# Create your tests here.
+LOCMEM = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+def create_user(username, **fields):
+    return User.objects.create_user(
+        email="{}@example.com".format(username), username=username, password="secret", **fields
+    )
+
+
+@override_settings(CACHES=LOCMEM, CONDUIT_TASK_INPROCESS_WORKER=False)
+class AuthorInvalidationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.admin = create_user("admin", is_staff=True)
+        self.author = create_user("bob")
+        self.topic = Topic.objects.create(content="Content", title="Title", user=self.author)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        # Skip the anonymous response cache, only the topic cache is tested.
+        self.client.credentials(HTTP_AUTHORIZATION="Bearer test")
+
+    def get_topic(self):
+        return self.client.get("/api/topic/{}/".format(self.topic._id)).json()
+
+    def test_deleted_author_hides_cached_topic(self):
+        self.assertEqual(self.get_topic()["code"], 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete("/api/user/bob/")
+        self.assertEqual(response.json()["code"], 202)
+        self.assertEqual(self.get_topic()["code"], 404)
+
+    def test_profile_update_refreshes_cached_topic(self):
+        self.assertEqual(self.get_topic()["data"]["user"]["nickname"], "")
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put("/api/user/bob/", {"nickname": "Bobby"}, format="json")
+        self.assertEqual(response.json()["code"], 200)
+        self.assertEqual(self.get_topic()["data"]["user"]["nickname"], "Bobby")
+
+
+@override_settings(CACHES=LOCMEM, CONDUIT_TASK_INPROCESS_WORKER=False)
+class CommenterInvalidationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.admin = create_user("admin", is_staff=True)
+        self.topic = Topic.objects.create(
+            content="Content", title="Title", user=create_user("bob")
+        )
+        Comment.objects.create(content="Hi", topic=self.topic, user=create_user("carol"))
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.client.credentials(HTTP_AUTHORIZATION="Bearer test")
+
+    def get_comments(self, client):
+        response = client.get("/api/topic/{}/".format(self.topic._id)).json()
+        return response["data"]["comments"]
+
+    def test_deleted_commenter_hides_cached_comments(self):
+        for client in (self.client, APIClient()):
+            self.assertEqual(len(self.get_comments(client)), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete("/api/user/carol/")
+        for client in (self.client, APIClient()):
+            self.assertEqual(self.get_comments(client), [])
+
+    def test_commenter_update_refreshes_cached_comments(self):
+        self.assertEqual(self.get_comments(APIClient())[0]["user"]["nickname"], "")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.put("/api/user/carol/", {"nickname": "Caro"}, format="json")
+        for client in (self.client, APIClient()):
+            self.assertEqual(self.get_comments(client)[0]["user"]["nickname"], "Caro")
+
+@override_settings(CACHES=LOCMEM, CONDUIT_TASK_INPROCESS_WORKER=False)
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.admin = create_user("admin", is_staff=True)
+        self.author = create_user("bob")
+        self.topic = Topic.objects.create(content="Content", title="Title", user=self.author)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.client.credentials(HTTP_AUTHORIZATION="Bearer test")
+
+    def get_topic(self):
+        return APIClient().get("/api/topic/{}/".format(self.topic._id)).json()
+
+    def test_author_changes_invalidate_cached_responses(self):
+        self.assertEqual(self.get_topic()["data"]["user"]["nickname"], "")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.put("/api/user/bob/", {"nickname": "Bobby"}, format="json")
+        self.assertEqual(self.get_topic()["data"]["user"]["nickname"], "Bobby")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete("/api/user/bob/")
+        self.assertEqual(self.get_topic()["code"], 404)
+
+
+@override_settings(
+    CACHES=LOCMEM, CONDUIT_TASK_INPROCESS_WORKER=False, CONDUIT_TRENDING_HALF_LIFE=60 * 60 * 24
+)
+class TrendingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.user = create_user("alice")
+        self.topic = Topic.objects.create(content="Content", title="Title", user=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def favor(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post("/api/topic/{}/favor/".format(self.topic._id))
+        self.assertEqual(response.json()["code"], 200)
+
+    def test_unfavor_takes_back_what_favor_added(self):
+        now = timezone.now()
+        TrendingEpoch.objects.create(epoch=now - timedelta(days=4))
+        with mock.patch("django.utils.timezone.now", return_value=now - timedelta(days=3)):
+            self.favor()
+        self.topic.refresh_from_db()
+        self.assertAlmostEqual(self.topic.trending_score, 2.0)
+
+        self.favor()
+        self.topic.refresh_from_db()
+        self.assertAlmostEqual(self.topic.trending_score, 0.0)
+
+    def test_comment_deletion_takes_back_its_boost(self):
+        now = timezone.now()
+        TrendingEpoch.objects.create(epoch=now - timedelta(days=4))
+        with mock.patch("django.utils.timezone.now", return_value=now - timedelta(days=3)):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(
+                    "/api/topic/{}/comment/".format(self.topic._id), {"content": "Hi"}, format="json"
+                )
+        comment_id = response.json()["data"]["comments"][0]["_id"]
+        self.topic.refresh_from_db()
+        self.assertAlmostEqual(self.topic.trending_score, 1.0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete("/api/topic/{}/comment/{}/".format(self.topic._id, comment_id))
+        self.topic.refresh_from_db()
+        self.assertAlmostEqual(self.topic.trending_score, 0.0)
+
+    def test_old_epoch_queues_a_rescale(self):
+        TrendingEpoch.objects.create(epoch=timezone.now() - timedelta(days=40))
+        self.favor()
+        self.assertTrue(Task.objects.filter(kind="rescale_trending").exists())
+
+    def test_overflowing_epoch_is_rescaled_first(self):
+        TrendingEpoch.objects.create(epoch=timezone.now() - timedelta(days=2000))
+        self.favor()
+        self.topic.refresh_from_db()
+        self.assertAlmostEqual(self.topic.trending_score, 1.0, places=3)
+
+
+def increment_many(name, n):
+    connections.close_all()
+    for _ in range(n):
+        increment(name)
+    connections.close_all()
+
+
+class VersionTests(TransactionTestCase):
+    def setUp(self):
+        if connection.vendor == "sqlite" and connection.is_in_memory_db():
+            self.skipTest("The test database must be shared between processes.")
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location, True)
+        caches = {
+            "default": {
+                "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                "LOCATION": location,
+            }
+        }
+        self.enterContext(override_settings(CACHES=caches))
+
+    def test_concurrent_increments_from_two_processes(self):
+        CacheVersion.objects.create(name="topics", version=0)
+        connections.close_all()
+        context = multiprocessing.get_context("fork")
+        processes = [context.Process(target=increment_many, args=("topics", 50)) for _ in range(2)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        self.assertEqual([process.exitcode for process in processes], [0, 0])
+
+        self.assertEqual(CacheVersion.objects.get(name="topics").version, 100)
+        self.assertEqual(get_version("topics"), 100)
+
+    def test_evicted_version_is_read_back(self):
+        version = increment("tags")
+        cache.delete(VERSION_KEY.format("tags"))
+        self.assertEqual(get_version("tags"), version)
+
+
+@override_settings(CACHES=LOCMEM, CONDUIT_EVENTS_POLL=0.05)
+class CacheBrokerTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_events_survive_an_evicted_sequence(self):
+        broker = CacheBroker()
+        publish = sync_to_async(broker.publish)
+
+        async def receive():
+            subscription = broker.subscribe("topic:1")
+            await asyncio.sleep(0.1)
+            await publish("topic:1", {"n": 1})
+            first = await subscription.get(1)
+            await sync_to_async(cache.clear)()
+            await publish("topic:1", {"n": 2})
+            second = await subscription.get(1)
+            broker.unsubscribe("topic:1", subscription)
+            # Let the poller notice it has no subscriber left.
+            await asyncio.sleep(0.1)
+            return [first, second]
+
+        self.assertEqual(async_to_sync(receive)(), [{"n": 1}, {"n": 2}])
+
+
+@override_settings(CACHES=LOCMEM, CONDUIT_TASK_INPROCESS_WORKER=False)
+class BatchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.user = create_user("alice")
+        self.topic = Topic.objects.create(content="Content", title="Title", user=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def batch(self, requests, **options):
+        return self.client.post(
+            "/api/batch/", {"requests": requests, **options}, format="json"
+        ).json()
+
+    def test_runs_sub_requests_in_order(self):
+        data = self.batch(
+            [
+                {"id": "topic", "path": "/api/topic/{}/".format(self.topic._id)},
+                {"id": "missing", "path": "/api/nowhere/"},
+            ]
+        )["data"]
+        self.assertEqual([item["id"] for item in data], ["topic", "missing"])
+        self.assertEqual(data[0]["body"]["data"]["title"], "Title")
+        self.assertEqual(data[1]["status"], 404)
+
+    def test_failing_sub_request_keeps_the_others(self):
+        requests = [
+            {"path": "/api/topic/{}/".format(self.topic._id)},
+            # No "tags": the topic creation view raises a KeyError.
+            {"body": {"content": "C", "title": "T"}, "method": "POST", "path": "/api/topics/"},
+            {"path": "/api/topics/"},
+        ]
+        with self.assertLogs("api.utils.batch", "ERROR"):
+            response = self.batch(requests)
+        self.assertEqual(response["code"], 200)
+        self.assertEqual([item["status"] for item in response["data"]], [200, 500, 200])
+        self.assertEqual(response["data"][1]["body"]["code"], 500)
+
+    def test_parallel_reads_survive_a_failure(self):
+        requests = [{"path": "/api/topics/"}, {"path": "/api/topic/{}/".format(self.topic._id)}]
+        with mock.patch("api.views.TopicViewSet.list", side_effect=RuntimeError):
+            with self.assertLogs("api.utils.batch", "ERROR"):
+                data = self.batch(requests, parallel=True)["data"]
+        self.assertEqual([item["status"] for item in data], [500, 200])
+
+
+@override_settings(CONDUIT_TASK_INPROCESS_WORKER=False)
+class WorkerTests(TestCase):
+    def setUp(self):
+        self.calls = []
+        patches = [
+            mock.patch.dict(registry),
+            # Tasks run in the test thread, inside the test transaction.
+            mock.patch("api.utils.tasks.close_old_connections"),
+            mock.patch("api.utils.tasks.connection"),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        task("test_batch", batch=True)(self.calls.append)
+        task("test_fail", max_attempts=2)(self.fail_task)
+        self.worker = Worker(threads=1, lease=60)
+        self.addCleanup(self.worker.executor.shutdown)
+
+    def fail_task(self, payload):
+        raise RuntimeError(payload["n"])
+
+    def run_claimed(self):
+        for t in self.worker.claim():
+            self.worker.execute([t])
+
+    def expire_leases(self):
+        Task.objects.update(locked_at=timezone.now() - timedelta(seconds=61))
+
+    def test_batch_handler_gets_all_payloads(self):
+        enqueue("test_batch", {"n": 1})
+        enqueue("test_batch", {"n": 2}, key="two")
+        self.worker.execute(self.worker.claim())
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(sorted(p["n"] for p in self.calls[0]), [1, 2])
+        # Only the keyed task is kept, to keep deduplicating.
+        self.assertEqual(list(Task.objects.values_list("key", "status")), [("two", "done")])
+
+    def test_failing_task_is_retried_then_failed(self):
+        t = enqueue("test_fail", {"n": 1})
+        with self.assertLogs("api.utils.tasks", "ERROR"):
+            self.run_claimed()
+        t.refresh_from_db()
+        self.assertEqual((t.status, t.attempts), ("pending", 1))
+        self.assertGreater(t.run_at, timezone.now())
+
+        Task.objects.update(run_at=timezone.now())
+        with self.assertLogs("api.utils.tasks", "ERROR"):
+            self.run_claimed()
+        t.refresh_from_db()
+        self.assertEqual((t.status, t.attempts), ("failed", 2))
+        self.assertIn("RuntimeError", t.error)
+
+    def test_late_completion_keeps_the_new_lease(self):
+        t = enqueue("test_batch", {"n": 1}, key="late")
+        stale = self.worker.claim()
+        self.expire_leases()
+        fresh = self.worker.claim()
+        self.assertEqual([c._id for c in fresh], [t._id])
+
+        self.worker.execute(stale)
+        t.refresh_from_db()
+        self.assertEqual((t.status, t.locked_by), ("running", fresh[0].locked_by))
+
+        self.worker.execute(fresh)
+        t.refresh_from_db()
+        self.assertEqual(t.status, "done")
+
+    def test_late_failure_keeps_the_new_lease(self):
+        t = enqueue("test_fail", {"n": 1})
+        stale = self.worker.claim()
+        self.expire_leases()
+        fresh = self.worker.claim()
+
+        with self.assertLogs("api.utils.tasks", "WARNING") as logs:
+            self.worker.execute(stale)
+        self.assertIn("lost its lease", logs.output[-1])
+        t.refresh_from_db()
+        self.assertEqual((t.status, t.locked_by), ("running", fresh[0].locked_by))
+
+
+@override_settings(CACHES=LOCMEM, CONDUIT_TAG_INDEX_CHECK=0)
+class TagAutocompleteTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        tag_index.built_at = None
+        self.addCleanup(setattr, tag_index, "built_at", None)
+        topic = Topic.objects.create(content="Content", title="Title", user=create_user("alice"))
+        with self.captureOnCommitCallbacks(execute=True):
+            tags = [Tag.objects.create(tag=name) for name in ("Django", "Docker", "Go")]
+        topic.tags.add(tags[1])
+        self.client = APIClient()
+
+    def complete(self, prefix):
+        response = self.client.get("/api/tags/autocomplete/", {"q": prefix}).json()
+        return [(item["tag"], item["usage"]) for item in response["data"]]
+
+    def test_completes_prefix_by_usage(self):
+        self.assertEqual(self.complete("D"), [("docker", 1), ("django", 0)])
+        self.assertEqual(self.complete("x"), [])
+
+    def test_local_tags_are_added_without_rebuilding(self):
+        self.complete("d")
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.create(tag="Dart")
+        with mock.patch.object(TagIndex, "build") as build:
+            self.assertIn(("dart", 0), self.complete("da"))
+        build.assert_not_called()
+
+    def test_other_writers_trigger_a_rebuild(self):
+        self.complete("d")
+        increment("tags")
+        with mock.patch.object(TagIndex, "build") as build:
+            self.complete("d")
+        build.assert_called_once()
+
+
+@override_settings(CACHES=LOCMEM, CONDUIT_TASK_INPROCESS_WORKER=False)
+class CommentCountTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.user = create_user("alice")
+        self.topic = Topic.objects.create(content="Content", title="Title", user=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def comment(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                "/api/topic/{}/comment/".format(self.topic._id), {"content": "Hi"}, format="json"
+            )
+        return response.json()["data"]["comments"][0]["_id"]
+
+    def test_counts_follow_comments(self):
+        comment_id = self.comment()
+        self.comment()
+        self.topic.refresh_from_db()
+        self.assertEqual(self.topic.comment_count, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete("/api/topic/{}/comment/{}/".format(self.topic._id, comment_id))
+        self.topic.refresh_from_db()
+        self.assertEqual(self.topic.comment_count, 1)
+        self.assertEqual(UserStats.objects.get(user=self.user).comment_count, 1)
+
+    def test_losing_a_delete_race_keeps_the_counts(self):
+        comment_id = self.comment()
+        self.comment()
+        url = "/api/topic/{}/comment/{}/".format(self.topic._id, comment_id)
+        comment = Comment.objects.get(pk=comment_id)
+        # A concurrent request deletes the row after this one has read it.
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(url)
+        with mock.patch("api.views.Comment.objects.get", return_value=comment):
+            response = self.client.delete(url)
+        self.assertEqual(response.json()["code"], 404)
+        self.topic.refresh_from_db()
+        self.assertEqual(self.topic.comment_count, 1)
+        self.assertEqual(UserStats.objects.get(user=self.user).comment_count, 1)
+
+
+@override_settings(CACHES=LOCMEM, CONDUIT_TASK_INPROCESS_WORKER=False)
+class FavorTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.user = create_user("alice")
+        self.topic = Topic.objects.create(content="Content", title="Title", user=create_user("bob"))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = "/api/topic/{}/favor/".format(self.topic._id)
+
+    def test_favor_toggles_and_flags_the_viewer(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            data = self.client.post(self.url).json()["data"]
+        self.assertTrue(data["favorited"])
+        self.assertEqual(data["favorite"], 1)
+        self.assertTrue(self.client.get("/api/topics/").json()["data"][0]["favorited"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            data = self.client.post(self.url).json()["data"]
+        self.assertFalse(data["favorited"])
+        self.assertEqual(data["favorite"], 0)
+
+    def test_losing_a_favor_race_is_already_favorited(self):
+        # A concurrent request adds the favorite after this one checked.
+        Favorite.objects.create(topic=self.topic, user=self.user)
+        with mock.patch("api.views.Favorite.objects.filter") as favorites:
+            favorites.return_value.first.return_value = None
+            response = self.client.post(self.url).json()
+        self.assertEqual(response["code"], 200)
+        self.assertTrue(response["data"]["favorited"])
+        self.topic.refresh_from_db()
+        self.assertEqual(self.topic.favorite, 0)
+
+
+@override_settings(CACHES=LOCMEM, CONDUIT_TASK_INPROCESS_WORKER=False)
+class CommentCursorTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.user = create_user("alice")
+        self.topic = Topic.objects.create(content="Content", title="Title", user=self.user)
+        now = timezone.now()
+        self.comments = [
+            Comment.objects.create(content=str(n), topic=self.topic, user=self.user)
+            for n in range(5)
+        ]
+        # Two comments share a timestamp, `_id` breaks the tie.
+        for n, comment in enumerate(self.comments):
+            Comment.objects.filter(pk=comment._id).update(
+                create_at=now + timedelta(seconds=min(n, 3))
+            )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION="Bearer test")
+
+    def walk(self, **params):
+        url = "/api/topic/{}/comment/".format(self.topic._id)
+        contents = []
+        response = self.client.get(url, {"size": 2, **params}).json()
+        while True:
+            contents += [comment["content"] for comment in response["data"]]
+            if not response["next"]:
+                return contents
+            response = self.client.get(response["next"]).json()
+
+    def test_pages_newest_first(self):
+        self.assertEqual(self.walk(), ["4", "3", "2", "1", "0"])
+
+    def test_pages_oldest_first(self):
+        self.assertEqual(self.walk(order="asc"), ["0", "1", "2", "3", "4"])
+
+
+@override_settings(CACHES=LOCMEM, CONDUIT_TASK_INPROCESS_WORKER=False)
+class LeanResponseTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.user = create_user("alice")
+        self.topic = Topic.objects.create(content="Content", title="Title", user=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def post(self, path, body=None, query="", **headers):
+        url = "/api/topic/{}/{}/{}".format(self.topic._id, path, query)
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(url, body, format="json", **headers).json()["data"]
+
+    def test_lean_comment_returns_the_comment(self):
+        data = self.post("comment", {"content": "Hi"}, "?response=lean")
+        self.assertEqual(data["content"], "Hi")
+        self.assertNotIn("comments", data)
+        self.assertIn("comments", self.post("comment", {"content": "Hi"}))
+
+    def test_prefer_header_selects_lean_favor(self):
+        data = self.post("favor", HTTP_PREFER="return=minimal")
+        self.assertEqual(data, {"favorited": True, "favorite_count": 1})
+
+    @override_settings(CONDUIT_WRITE_RESPONSE="lean")
+    def test_query_parameter_overrides_the_default(self):
+        self.assertEqual(self.post("favor"), {"favorited": True, "favorite_count": 1})
+        self.assertEqual(self.post("favor", query="?response=full")["title"], "Title")
+
+
+@override_settings(CACHES=LOCMEM, CONDUIT_TASK_INPROCESS_WORKER=False)
+class FavoritesFeedTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.user = create_user("alice")
+        author = create_user("bob")
+        topics = [
+            Topic.objects.create(content="Content", title=str(n), user=author) for n in range(3)
+        ]
+        # Favorited in another order than created.
+        now = timezone.now()
+        for seconds, n in enumerate((2, 0, 1)):
+            Favorite.objects.create(topic=topics[n], user=self.user)
+            Favorite.objects.filter(topic=topics[n]).update(
+                create_at=now + timedelta(seconds=seconds)
+            )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION="Bearer test")
+
+    def test_newest_favorite_first(self):
+        for url in ("/api/my-favorites/", "/api/profile/alice/favorites/"):
+            response = self.client.get(url).json()
+            self.assertEqual([topic["title"] for topic in response["data"]], ["1", "0", "2"])
+            self.assertEqual(response["total"], 3)
+
+
+@override_settings(CACHES=LOCMEM, CONDUIT_TASK_INPROCESS_WORKER=False)
+class FieldsetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.user = create_user("alice")
+        self.topic = Topic.objects.create(content="Content", title="Title", user=self.user)
+        Comment.objects.create(content="Hi", topic=self.topic, user=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION="Bearer test")
+
+    def get(self, url, **params):
+        return self.client.get(url, params).json()["data"]
+
+    def test_fields_selects_nested_paths(self):
+        data = self.get("/api/topic/{}/".format(self.topic._id), fields="title,user.username")
+        self.assertEqual(data, {"title": "Title", "user": {"username": "alice"}})
+
+    def test_omit_drops_nested_paths(self):
+        data = self.get("/api/topic/{}/comment/".format(self.topic._id), omit="user.email")
+        self.assertIn("username", data[0]["user"])
+        self.assertNotIn("email", data[0]["user"])
+
+    def test_lists_defer_unselected_content(self):
+        self.assertNotIn("content", self.get("/api/topics/")[0])
+        self.assertEqual(self.get("/api/topics/", fields="content"), [{"content": "Content"}])
+
+    def test_plan_loads_only_selected_columns(self):
+        topic = TopicReadSerializer.plan(Topic.objects.all(), fields="title,user.username").get()
+        self.assertIn("content", topic.get_deferred_fields())
+        self.assertIn("bio", topic.user.get_deferred_fields())
+
+
+@override_settings(CACHES=LOCMEM, CONDUIT_TASK_INPROCESS_WORKER=False)
+class ExcerptTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.user = create_user("alice")
+
+    def test_excerpt_strips_markdown(self):
+        content = "# Hello\n\nSome **bold** [link](http://example.com) text."
+        topic = Topic.objects.create(content=content, title="Title", user=self.user)
+        self.assertEqual(topic.excerpt, "Hello Some bold link text.")
+        self.assertEqual((topic.content_length, topic.reading_time), (len(content), 1))
+
+    def test_long_content_is_cut_at_a_word(self):
+        topic = Topic.objects.create(content="word " * 300, title="Title", user=self.user)
+        self.assertTrue(topic.excerpt.endswith("word…"))
+        self.assertLessEqual(len(topic.excerpt), 201)
+        self.assertEqual(topic.reading_time, 2)
+
+        topic.content = "Short."
+        topic.save(update_fields=["content"])
+        topic.refresh_from_db()
+        self.assertEqual(topic.excerpt, "Short.")
+
+    def test_lists_serve_the_excerpt(self):
+        Topic.objects.create(content="Some *text*.", title="Title", user=self.user)
+        data = APIClient().get("/api/topics/").json()["data"]
+        self.assertEqual(data[0]["excerpt"], "Some text.")
+        self.assertNotIn("content", data[0])
+
+    def test_backfill_fills_existing_rows(self):
+        topic = Topic.objects.create(content="Some text.", title="Title", user=self.user)
+        Topic.objects.update(content_length=0, excerpt="", reading_time=0)
+        call_command("backfill_topic_excerpts", batch_size=1, stdout=StringIO())
+        topic.refresh_from_db()
+        self.assertEqual((topic.excerpt, topic.reading_time), ("Some text.", 1))
+
+
+@override_settings(CACHES=LOCMEM, CONDUIT_TASK_INPROCESS_WORKER=False)
+class MarkdownTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        render_cache.clear()
+
+    def test_raw_html_and_unsafe_links_are_neutralized(self):
+        rendered = render_markdown(
+            "<script>alert(1)</script>\n\n[x](javascript:alert(1)) [y](https://example.com)"
+        )
+        self.assertNotIn("<script", rendered)
+        self.assertNotIn("javascript:", rendered)
+        self.assertIn('href="https://example.com"', rendered)
+
+    def test_renders_are_cached_by_content_hash(self):
+        rendered = render_markdown("**bold**")
+        self.assertIn("<strong>bold</strong>", rendered)
+        self.assertEqual(cache.get(content_key("**bold**")), rendered)
+
+        render_cache.clear()
+        with mock.patch("api.utils.render.to_html") as to_html:
+            self.assertEqual(render_markdown("**bold**"), rendered)
+        to_html.assert_not_called()
+
+    def test_expand_adds_rendered_content(self):
+        topic = Topic.objects.create(content="*Hi*", title="Title", user=create_user("alice"))
+        url = "/api/topic/{}/".format(topic._id)
+        self.assertNotIn("content_html", APIClient().get(url).json()["data"])
+        data = APIClient().get(url, {"expand": "content_html"}).json()["data"]
+        self.assertEqual(data["content_html"], "<p><em>Hi</em></p>")
+
+
+@override_settings(
+    CACHES=LOCMEM, CONDUIT_PURGE_BATCH_SIZE=1, CONDUIT_TASK_INPROCESS_WORKER=False
+)
+class PurgeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.admin = create_user("admin", is_staff=True)
+        self.author = create_user("alice")
+        self.bob = create_user("bob")
+        self.topic = Topic.objects.create(content="Content", title="Title", user=self.author)
+        self.topic.tags.add(Tag.objects.create(tag="django"))
+        for user in (self.author, self.bob, self.bob):
+            Comment.objects.create(content="Hi", topic=self.topic, user=user)
+        Favorite.objects.create(topic=self.topic, user=self.bob)
+        Topic.objects.filter(pk=self.topic._id).update(comment_count=3, favorite=1)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def delete(self, url):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.delete(url).json()
+
+    def test_deleted_topic_is_hidden_then_purged(self):
+        response = self.delete("/api/topic/{}/".format(self.topic._id))
+        self.assertEqual(response["code"], 202)
+        job_id = response["data"]["_id"]
+        self.assertEqual(Task.objects.get().payload, {"job": job_id})
+        response = self.client.get("/api/topic/{}/".format(self.topic._id))
+        self.assertEqual(response.json()["code"], 404)
+
+        call_command("run_purge_jobs", stdout=StringIO())
+        job = self.client.get("/api/purge/{}/".format(job_id)).json()["data"]
+        # 3 comments, 1 favorite, 1 tag link and the topic.
+        self.assertEqual((job["status"], job["deleted"]), ("done", 6))
+        self.assertFalse(Topic.all_objects.exists())
+        self.assertFalse(Comment.all_objects.exists())
+
+    def test_user_purge_releases_counters(self):
+        job_id = self.delete("/api/user/bob/")["data"]["_id"]
+        run_job(job_id)
+        self.assertFalse(User.all_objects.filter(username="bob").exists())
+        self.topic.refresh_from_db()
+        self.assertEqual((self.topic.comment_count, self.topic.favorite), (1, 0))
+        # Running a finished job again is a no-op.
+        self.assertEqual(run_job(job_id).deleted, PurgeJob.objects.get(pk=job_id).deleted)
+
+
+@override_settings(
+    CACHES=LOCMEM, CONDUIT_MULTIGET_MAX_IDS=4, CONDUIT_TASK_INPROCESS_WORKER=False
+)
+class MultiGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.user = create_user("alice")
+        self.topics = [
+            Topic.objects.create(content="Content", title=str(n), user=self.user) for n in range(3)
+        ]
+        Favorite.objects.create(topic=self.topics[1], user=self.user)
+        self.client = self.client_for(self.user)
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        client.credentials(HTTP_AUTHORIZATION="Bearer test")
+        return client
+
+    def get(self, ids, client=None):
+        return (client or self.client).get("/api/topics/", {"ids": ids}).json()
+
+    def test_returns_requested_order_and_missing_ids(self):
+        ids = [self.topics[2]._id, 999, self.topics[0]._id, self.topics[2]._id]
+        response = self.get(",".join(map(str, ids)))
+        self.assertEqual([topic["title"] for topic in response["data"]], ["2", "0"])
+        self.assertEqual(response["missing"], [999])
+
+    def test_cached_topics_keep_per_viewer_flags(self):
+        ids = ",".join(str(topic._id) for topic in self.topics)
+        self.assertEqual([t["favorited"] for t in self.get(ids)["data"]], [False, True, False])
+        client = self.client_for(create_user("bob"))
+        # Served from the cache, only the favorited flags are queried.
+        with self.assertNumQueries(1):
+            data = self.get(ids, client)["data"]
+        self.assertEqual([t["favorited"] for t in data], [False, False, False])
+
+    def test_rejects_bad_id_lists(self):
+        for ids in ("", "1,x", "1,2,3,4,5"):
+            self.assertEqual(self.get(ids)["code"], 400)
+
+
+@override_settings(CACHES=LOCMEM, CONDUIT_RELATED_TOP_K=2, CONDUIT_TASK_INPROCESS_WORKER=False)
+class RelatedTopicTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.user = create_user("alice")
+        self.tags = {name: Tag.objects.create(tag=name) for name in ("django", "go", "python")}
+        self.topics = {}
+        for title, tags in (("A", "django python"), ("B", "django python"), ("C", "python")):
+            self.add_topic(title, tags)
+        self.add_topic("D", "go")
+        self.client = APIClient()
+
+    def add_topic(self, title, tags):
+        topic = Topic.objects.create(content="Content", title=title, user=self.user)
+        topic.tags.set([self.tags[name] for name in tags.split()])
+        self.topics[title] = topic
+        return topic
+
+    def related(self, title):
+        url = "/api/topic/{}/related/".format(self.topics[title]._id)
+        return [topic["title"] for topic in self.client.get(url).json()["data"]]
+
+    def test_build_ranks_by_shared_tags(self):
+        self.assertEqual(build(batch_size=2), 4)
+        self.assertEqual(self.related("A"), ["B", "C"])
+        self.assertEqual(self.related("C"), ["A", "B"])
+        self.assertEqual(self.related("D"), [])
+
+    def test_refresh_offers_a_new_topic_to_its_neighbours(self):
+        build()
+        topic = self.add_topic("E", "django python")
+        refresh({topic._id})
+        self.assertEqual(self.related("E"), ["A", "B"])
+        # A keeps its top 2, C drops out.
+        self.assertEqual(self.related("A"), ["B", "E"])
+
+
+@override_settings(CACHES=LOCMEM, CONDUIT_TASK_INPROCESS_WORKER=False)
+class UserStatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.alice = create_user("alice")
+        self.bob = create_user("bob")
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_writes_keep_the_stats(self):
+        body = {"content": "Content", "tags": ["django"], "title": "Title", "user": self.alice._id}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post("/api/topics/", body, format="json")
+            topic_id = Topic.objects.get()._id
+            bob = APIClient()
+            bob.force_authenticate(self.bob)
+            bob.post("/api/topic/{}/favor/".format(topic_id))
+            bob.post("/api/topic/{}/comment/".format(topic_id), {"content": "Hi"}, format="json")
+
+        alice, bob = self.stats(self.alice), self.stats(self.bob)
+        self.assertEqual((alice.topic_count, alice.favorites_received), (1, 1))
+        self.assertEqual((bob.comment_count, bob.favorites_given), (1, 1))
+        self.assertIsNotNone(bob.last_active)
+        stats = self.client.get("/api/user/alice/").json()["data"]["stats"]
+        self.assertEqual(stats["topic_count"], 1)
+
+    def test_missing_or_drifted_rows_are_rebuilt(self):
+        Topic.objects.create(content="Content", title="Title", user=self.alice)
+        UserStats.objects.filter(user=self.alice).delete()
+        UserStats.objects.filter(user=self.bob).update(comment_count=5)
+
+        call_command("reconcile_user_stats", batch_size=1, stdout=StringIO())
+        self.assertEqual(self.stats(self.alice).topic_count, 1)
+        self.assertEqual(self.stats(self.bob).comment_count, 0)
+
+
+@override_settings(
+    CACHES=LOCMEM, CONDUIT_PASSWORD_WORKERS=0, CONDUIT_TASK_INPROCESS_WORKER=False
+)
+class ProfileCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.user = create_user("alice")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION="Bearer test")
+
+    def get(self, username):
+        return self.client.get("/api/user/{}/".format(username)).json()
+
+    def test_cached_profile_skips_the_user_lookup(self):
+        self.assertEqual(self.get("alice")["data"]["username"], "alice")
+        # Only the stats are read fresh.
+        with self.assertNumQueries(1):
+            data = self.get("alice")["data"]
+        self.assertEqual(data["stats"]["topic_count"], 0)
+
+    def test_settings_update_refreshes_the_profile(self):
+        self.get("alice")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.put("/api/settings/", {"bio": "Hello"}, format="json")
+        self.assertEqual(self.get("alice")["data"]["bio"], "Hello")
+
+    def test_missing_username_is_cached_until_sign_up(self):
+        self.assertEqual(self.get("carol")["code"], 404)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get("carol")["code"], 404)
+
+        body = {
+            "confirm_password": "secret12",
+            "email": "carol@example.com",
+            "password": "secret12",
+            "username": "carol",
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post("/api/users/", body, format="json")
+        self.assertEqual(response.json()["code"], 201)
+        self.assertEqual(self.get("carol")["data"]["username"], "carol")
+
+
+@override_settings(CACHES=LOCMEM, CONDUIT_CACHE_WAIT=0.1)
+class SingleFlightTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.key = TOPIC_KEY.format(1)
+        # Read the version here, the threads below have no test database.
+        self.version = get_versions([self.key])[self.key]
+        self.loads = []
+
+    def load(self, ids):
+        self.loads.append(ids)
+        time.sleep(0.1)
+        return {topic_id: {"title": "Fresh"} for topic_id in ids}
+
+    def test_concurrent_misses_load_once(self):
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(load_topics([1], self.load)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.loads, [[1]])
+        self.assertEqual(results, [{1: {"title": "Fresh"}}] * 5)
+
+    def test_other_leaders_stale_value_is_served(self):
+        cache.add(LEASE_KEY.format(versioned(self.key, self.version)), 1)
+        cache.set(STALE_KEY.format(self.key), {"title": "Stale"})
+        self.assertEqual(load_topics([1], self.load), {1: {"title": "Stale"}})
+        self.assertEqual(self.loads, [])
+
+    def test_stuck_leader_is_loaded_around(self):
+        cache.add(LEASE_KEY.format(versioned(self.key, self.version)), 1)
+        self.assertEqual(load_topics([1], self.load), {1: {"title": "Fresh"}})
+        self.assertEqual(self.loads, [[1]])
+
+
+@override_settings(CONDUIT_ADMISSION_MAX_INFLIGHT={"low": 1, "normal": 1})
+class AdmissionControlTests(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.inner = []
+        self.middleware = AdmissionControlMiddleware(self.get_response)
+
+    def get_response(self, request):
+        if self.inner:
+            return self.middleware(self.inner.pop())
+        return HttpResponse()
+
+    def test_classifies_routes(self):
+        classify = self.middleware.classify
+        self.assertEqual(classify(self.factory.post("/api/token/")), "critical")
+        self.assertEqual(classify(self.factory.post("/api/topics/")), "critical")
+        self.assertEqual(classify(self.factory.get("/api/topics/")), "normal")
+        self.assertEqual(classify(self.factory.get("/api/topics/", {"page": 21})), "low")
+        self.assertEqual(classify(self.factory.get("/api/users/")), "low")
+        self.assertIsNone(classify(self.factory.get("/api/topic/1/events/")))
+
+    def test_full_class_gets_503_others_go_on(self):
+        # The inner request arrives while the outer one is in flight.
+        self.inner = [self.factory.get("/api/tags/")]
+        response = self.middleware(self.factory.get("/api/users/"))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "5")
+
+        self.inner = [self.factory.post("/api/topics/")]
+        self.assertEqual(self.middleware(self.factory.get("/api/users/")).status_code, 200)
+        self.assertEqual(self.middleware.classes["low"].inflight, 0)
+
+    def test_slow_normal_class_sheds_low_priority(self):
+        self.middleware.classes["normal"].record(60, time.monotonic())
+        self.assertEqual(self.middleware(self.factory.get("/api/users/")).status_code, 429)
+        self.assertEqual(self.middleware(self.factory.get("/api/topics/")).status_code, 200)
+
+
+class ApiFastPathTests(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def request(self, path="/api/topics/", method="get", **headers):
+        return getattr(self.factory, method)(path, HTTP_AUTHORIZATION="Bearer x", **headers)
+
+    def get_response(self, request):
+        request.session["seen"] = True
+        return HttpResponse()
+
+    def test_only_bearer_api_requests_take_the_fast_path(self):
+        self.assertTrue(api_fast_path(self.request()))
+        self.assertFalse(api_fast_path(self.request("/api/auth/login/")))
+        self.assertFalse(api_fast_path(self.request("/")))
+        self.assertFalse(api_fast_path(self.factory.get("/api/topics/")))
+        with self.settings(CONDUIT_API_FAST_PATH=False):
+            self.assertFalse(api_fast_path(self.request()))
+
+    def test_fast_path_skips_the_session(self):
+        middleware = ApiSessionMiddleware(self.get_response)
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, middleware(self.request()).cookies)
+        response = middleware(self.factory.get("/api/topics/"))
+        self.assertIn(settings.SESSION_COOKIE_NAME, response.cookies)
+
+    def test_fast_path_skips_csrf_checks(self):
+        middleware = ApiCsrfViewMiddleware(self.get_response)
+        fast, slow = self.request(method="post"), self.factory.post("/api/topics/")
+        for request in (fast, slow):
+            middleware.process_request(request)
+        self.assertIsNone(middleware.process_view(fast, HttpResponse, (), {}))
+        self.assertEqual(middleware.process_view(slow, HttpResponse, (), {}).status_code, 403)
+
+
+@override_settings(CACHES=LOCMEM, CONDUIT_PASSWORD_WORKERS=0)
+class PasswordPoolTests(TestCase):
+    def setUp(self):
+        self.user = create_user("alice")
+
+    def test_hashes_in_a_worker_process(self):
+        pool = PasswordPool()
+        with self.settings(CONDUIT_PASSWORD_WORKERS=1):
+            encoded = pool.run(timed_make, "secret")
+            self.addCleanup(pool._executor.shutdown)
+        self.assertTrue(check_password("secret", encoded))
+        self.assertEqual(pool.stats()["completed"], 1)
+
+    def test_full_pool_rejects_with_retry_after(self):
+        pool = PasswordPool()
+        with self.settings(
+            CONDUIT_PASSWORD_QUEUE_SIZE=0,
+            CONDUIT_PASSWORD_QUEUE_TIMEOUT=0,
+            CONDUIT_PASSWORD_WORKERS=1,
+        ):
+            executor, slots = pool.executor()
+            self.addCleanup(executor.shutdown)
+            slots.acquire()
+            with self.assertRaises(PasswordPoolBusy):
+                pool.run(timed_make, "secret")
+        self.assertEqual(pool.stats()["rejected"], 1)
+
+        body = {"email": "alice@example.com", "password": "secret"}
+        with mock.patch.object(password_pool, "run", side_effect=PasswordPoolBusy):
+            response = APIClient().post("/api/token/", body, format="json")
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "1")
+
+    def test_login_rehashes_outdated_hashes(self):
+        User.objects.filter(pk=self.user._id).update(
+            password=make_password("secret", hasher="pbkdf2_sha1")
+        )
+        self.assertIsNone(authenticate(email="alice@example.com", password="wrong"))
+        self.assertEqual(authenticate(email="alice@example.com", password="secret"), self.user)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith("pbkdf2_sha256$"))
+
+
+@override_settings(
+    CACHES=LOCMEM,
+    CONDUIT_PASSWORD_WORKERS=0,
+    CONDUIT_PROVISION_MAX_USERS=4,
+    CONDUIT_TASK_INPROCESS_WORKER=False,
+)
+class ProvisionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.admin = create_user("admin", is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def provision(self, users, client=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = (client or self.client).post(
+                "/api/users/bulk/", {"users": users}, format="json"
+            )
+        return response
+
+    def test_creates_valid_rows_and_reports_the_others(self):
+        users = [
+            {"email": "carol@example.com", "password": "secret", "username": "carol"},
+            {"email": "admin@example.com", "password": "secret", "username": "other"},
+            {"email": "carol2@example.com", "password": "secret", "username": "carol"},
+            {"email": "not an e-mail", "password": "secret", "username": "dave"},
+        ]
+        body = self.provision(users).json()
+        self.assertEqual(body["code"], 207)
+        self.assertEqual([user["username"] for user in body["data"]["created"]], ["carol"])
+        self.assertEqual([error["index"] for error in body["data"]["errors"]], [1, 2, 3])
+        self.assertIn("email", body["data"]["errors"][0]["error"])
+
+        carol = authenticate(email="carol@example.com", password="secret")
+        self.assertEqual(carol.username, "carol")
+        self.assertTrue(UserStats.objects.filter(user=carol).exists())
+
+    def test_rejects_oversized_batches_and_non_admins(self):
+        users = [
+            {"email": "{}@example.com".format(name), "password": "x", "username": name}
+            for name in ("user{}".format(n) for n in range(5))
+        ]
+        self.assertEqual(self.provision(users).json()["code"], 400)
+
+        client = APIClient()
+        client.force_authenticate(create_user("bob"))
+        self.assertEqual(self.provision(users[:1], client).status_code, 403)
+        self.assertFalse(User.objects.filter(username__startswith="user").exists())
+
+    def test_command_reads_csv(self):
+        path = os.path.join(tempfile.mkdtemp(), "users.csv")
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        with open(path, "w") as f:
+            f.write("email,password,username,bio\n")
+            f.write("carol@example.com,secret,carol,\n")
+            f.write("admin@example.com,secret,other,Taken\n")
+
+        out, err = StringIO(), StringIO()
+        call_command("provision_users", path, stdout=out, stderr=err)
+        self.assertIn("Created 1 users, rejected 1.", out.getvalue())
+        self.assertIn("Row 2:", err.getvalue())
+        self.assertEqual(User.objects.get(username="carol").bio, "")
@@ -3,11 +3,18 @@ from api import views
 
 urlpatterns = [
     path("", views.api_root),
+    path("batch/", views.batch, name="batch"),
+    path("metrics/passwords/", views.password_metrics, name="password-metrics"),
     path(
         "topics/",
         views.TopicViewSet.as_view({"get": "list", "post": "create"}),
         name="topic-list",
     ),
+    path(
+        "topics/trending/",
+        views.TopicViewSet.as_view({"get": "trending"}),
+        name="topic-trending",
+    ),
     re_path(
         r"^topic/(?P<pk>\d+)/$",
         views.TopicViewSet.as_view({"delete": "destroy", "get": "retrieve", "put": "update"}),
@@ -38,6 +45,12 @@ urlpatterns = [
         views.TopicViewSet.as_view({"post": "favor"}),
         name="topic-favor",
     ),
+    re_path(r"^topic/(?P<pk>\d+)/events/$", views.topic_events, name="topic-events"),
+    re_path(
+        r"^topic/(?P<pk>\d+)/related/$",
+        views.TopicViewSet.as_view({"get": "related"}),
+        name="topic-related",
+    ),
     re_path(
         r"^topic/(?P<pk>\d+)/comment/$",
         views.CommentViewSet.as_view({"get": "list", "post": "create"}),
@@ -48,13 +61,24 @@ urlpatterns = [
         views.CommentViewSet.as_view({"delete": "destroy", "get": "retrieve"}),
         name="topic-comment",
     ),
+    re_path(
+        r"^purge/(?P<pk>\d+)/$",
+        views.PurgeJobViewSet.as_view({"get": "retrieve"}),
+        name="purge-detail",
+    ),
     path("tags/", views.TagViewSet.as_view({"get": "list"}), name="tag-list"),
+    path(
+        "tags/autocomplete/",
+        views.TagViewSet.as_view({"get": "autocomplete"}),
+        name="tag-autocomplete",
+    ),
     path("tag/<str:tag>/", views.TagViewSet.as_view({"get": "retrieve"}), name="tag-detail"),
     path(
         "users/",
         views.UserViewSet.as_view({"get": "list", "post": "create"}),
         name="user-list",
     ),
+    path("users/bulk/", views.UserViewSet.as_view({"post": "provision"}), name="user-bulk"),
     path(
         "user/<str:username>/",
         views.UserViewSet.as_view({"delete": "destroy", "get": "retrieve", "put": "update"}),
@@ -0,0 +1,107 @@
+import bisect
+import heapq
+import threading
+import time
+from django.conf import settings
+from django.db.models import Count, Q
+from api.models import Tag
+from api.utils.versions import get_version
+
+
+def normalize(name):
+    return name.strip().lower()
+
+
+class TagIndex(object):
+    """
+    Sorted array of normalized tag names with their usage counts, answering
+    prefix queries with two bisections. Built on first use, kept up to date
+    by the Tag / topic-tag signals of this process. It is rebuilt from the
+    database when another node has created tags, which the "tags" version
+    tells at most every CONDUIT_TAG_INDEX_CHECK seconds, and every
+    CONDUIT_TAG_INDEX_TTL seconds to pick up usage counts.
+
+    The names and counts are published together as one `(names, usage)`
+    tuple, replaced and never modified, so readers need no lock.
+    """
+
+    def __init__(self):
+        self.built_at = None
+        self.checked_at = None
+        self.snapshot = ([], {})
+        self.version = None
+        self._lock = threading.Lock()
+
+    def build(self):
+        version = get_version("tags")
+        live = Q(topic_tags__delete_at__isnull=True)
+        usage = {}
+        for name, n in Tag.objects.annotate(n=Count("topic_tags", filter=live)).values_list(
+            "tag", "n"
+        ):
+            key = normalize(name)
+            usage[key] = usage.get(key, 0) + n
+
+        with self._lock:
+            self.snapshot = (sorted(usage), usage)
+            self.version = version
+            self.built_at = self.checked_at = time.monotonic()
+
+    def stale(self):
+        now = time.monotonic()
+        ttl = getattr(settings, "CONDUIT_TAG_INDEX_TTL", 300)
+        if self.built_at is None or now - self.built_at > ttl:
+            return True
+
+        if now - self.checked_at > getattr(settings, "CONDUIT_TAG_INDEX_CHECK", 1):
+            self.checked_at = now
+            return get_version("tags") != self.version
+        return False
+
+    def add(self, name, version=None):
+        """
+        Insert a tag created by this process. `version` is the "tags" version
+        its creation moved to: when it directly follows the indexed one, no
+        other writer came in between and the index stays current.
+        """
+        key = normalize(name)
+        with self._lock:
+            if self.built_at is None:
+                return
+            if version is not None and self.version is not None and version == self.version + 1:
+                self.version = version
+            names, usage = self.snapshot
+            if key in usage:
+                return
+            names = list(names)
+            bisect.insort(names, key)
+            self.snapshot = (names, {**usage, key: 0})
+
+    def use(self, names, delta=1):
+        with self._lock:
+            if self.built_at is None:
+                return
+            sorted_names, usage = self.snapshot
+            usage = dict(usage)
+            for name in names:
+                key = normalize(name)
+                if key in usage:
+                    usage[key] = max(usage[key] + delta, 0)
+            self.snapshot = (sorted_names, usage)
+
+    def complete(self, prefix, limit=10):
+        """
+        The `limit` most used tags starting with `prefix`, as (name, usage).
+        """
+        if self.stale():
+            self.build()
+
+        names, usage = self.snapshot
+        key = normalize(prefix)
+        lo = bisect.bisect_left(names, key)
+        hi = bisect.bisect_left(names, key + "\U0010ffff", lo)
+        matches = heapq.nsmallest(limit, names[lo:hi], key=lambda name: (-usage[name], name))
+        return [(name, usage[name]) for name in matches]
+
+
+tag_index = TagIndex()
@@ -0,0 +1,141 @@
+import asyncio
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from urllib.parse import urlsplit
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import close_old_connections, connection
+from django.urls import Resolver404, resolve
+from rest_framework import status
+
+logger = logging.getLogger(__name__)
+
+BATCH_PATH = "/api/batch/"
+METHODS = ("DELETE", "GET", "PATCH", "POST", "PUT")
+
+
+class BatchError(ValueError):
+    pass
+
+
+def parse_items(data):
+    """
+    Validate the batch body and return its sub-requests as
+    `(id, method, path, body)` tuples.
+    """
+    items = data.get("requests") if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        raise BatchError("'requests' must be a non-empty list.")
+
+    limit = getattr(settings, "CONDUIT_BATCH_MAX_REQUESTS", 20)
+    if len(items) > limit:
+        raise BatchError("At most {} requests per batch.".format(limit))
+
+    parsed = []
+    for i, item in enumerate(items):
+        if not isinstance(item, dict):
+            raise BatchError("Request {} must be an object.".format(i))
+
+        method = str(item.get("method", "GET")).upper()
+        path = item.get("path")
+        if method not in METHODS:
+            raise BatchError("Request {} has an unsupported method.".format(i))
+        if not isinstance(path, str) or not path.startswith("/api/"):
+            raise BatchError("Request {} must target a path under /api/.".format(i))
+        if urlsplit(path).path == BATCH_PATH:
+            raise BatchError("Batch requests can't be nested.")
+
+        parsed.append((item.get("id", i), method, path, item.get("body")))
+    return parsed
+
+
+def run_batch(request, items, parallel=False):
+    """
+    Execute the sub-requests with the already authenticated user of
+    `request`. Independent reads run on a thread pool when `parallel` is set
+    and every sub-request is a GET, otherwise they run in order.
+    """
+    if parallel and all(method == "GET" for _, method, _, _ in items):
+        workers = getattr(settings, "CONDUIT_BATCH_MAX_WORKERS", 4)
+        with ThreadPoolExecutor(max_workers=min(workers, len(items))) as executor:
+            return list(executor.map(lambda item: run_in_thread(request, item), items))
+
+    return [run_one(request, item) for item in items]
+
+
+def run_in_thread(request, item):
+    close_old_connections()
+    try:
+        return run_one(request, item)
+    finally:
+        connection.close()
+
+
+def run_one(request, item):
+    item_id, method, path, body = item
+    url = urlsplit(path)
+    try:
+        match = resolve(url.path)
+    except Resolver404:
+        return result(item_id, status.HTTP_404_NOT_FOUND, {"msg": "Not found."})
+
+    if asyncio.iscoroutinefunction(match.func):
+        return result(
+            item_id,
+            status.HTTP_400_BAD_REQUEST,
+            {"msg": "Streaming endpoints can't be batched."},
+        )
+
+    sub = build_request(request, method, url, body)
+    try:
+        response = match.func(sub, *match.args, **match.kwargs)
+    except Exception:
+        # One failing sub-request must not lose the results of the others.
+        logger.exception("Batch sub-request %s %s failed", method, path)
+        return result(
+            item_id,
+            status.HTTP_500_INTERNAL_SERVER_ERROR,
+            {"code": status.HTTP_500_INTERNAL_SERVER_ERROR, "msg": "Internal server error."},
+        )
+    if getattr(response, "streaming", False):
+        return result(
+            item_id,
+            status.HTTP_400_BAD_REQUEST,
+            {"msg": "Streaming endpoints can't be batched."},
+        )
+
+    if hasattr(response, "render"):
+        response.render()
+    try:
+        content = json.loads(response.content or b"null")
+    except ValueError:
+        content = response.content.decode(response.charset, "replace")
+    return result(item_id, response.status_code, content)
+
+
+def build_request(request, method, url, body):
+    payload = b"" if body is None else json.dumps(body).encode("utf-8")
+    environ = request._request.META.copy()
+    environ.update(
+        {
+            "CONTENT_LENGTH": str(len(payload)),
+            "CONTENT_TYPE": "application/json",
+            "HTTP_ACCEPT": "application/json",
+            "PATH_INFO": url.path,
+            "QUERY_STRING": url.query,
+            "REQUEST_METHOD": method,
+            "wsgi.input": BytesIO(payload),
+        }
+    )
+    environ.setdefault("wsgi.url_scheme", request.scheme)
+    sub = WSGIRequest(environ)
+    # Picked up by DRF's Request, so the batch authenticates only once.
+    sub._force_auth_user = request.user
+    sub._force_auth_token = request.auth
+    return sub
+
+
+def result(item_id, code, body):
+    return {"body": body, "id": item_id, "status": code}
@@ -0,0 +1,230 @@
+import time
+from urllib.parse import quote
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from api.models import Comment, Topic
+from api.utils.coalesce import poll, single_flight
+from api.utils.render import LRUCache
+from api.utils.versions import bump, get_version, get_versions, versioned
+
+PROFILE_KEY = "profile:{}"
+STALE_KEY = "stale:{}"
+TOPIC_KEY = "topic:{}"
+
+# Marks a topic its leader found missing, as opposed to failing to load.
+NOT_FOUND = object()
+
+# Per-viewer fields are left out of the shared cache and added per request.
+VIEWER_FIELDS = ("favorited",)
+
+# Profile fields changing with the user's activity are read fresh.
+PROFILE_FRESH_FIELDS = ("stats",)
+
+# Entries are versioned, so the per-process copy never outlives a write made
+# on another node, only its own timeout.
+local_cache = LRUCache(getattr(settings, "CONDUIT_LOCAL_CACHE_SIZE", 1024))
+
+
+def topic_timeout():
+    return getattr(settings, "CONDUIT_TOPIC_CACHE_TIMEOUT", 300)
+
+
+def tiered_get(keys):
+    """
+    Look versioned `keys` up in the local cache first and in the shared cache
+    second, return the entries found as {key: value}.
+    """
+    now = time.monotonic()
+    found = {}
+    missing = []
+    for key in keys:
+        entry = local_cache.get(key)
+        if entry is not None and entry[0] > now:
+            found[key] = entry[1]
+        else:
+            missing.append(key)
+
+    if missing:
+        shared = cache.get_many(missing)
+        for key, value in shared.items():
+            local_cache.set(key, (now + local_timeout(), value))
+        found.update(shared)
+    return found
+
+
+def tiered_set(items, timeout):
+    cache.set_many(items, timeout)
+    expires = time.monotonic() + min(timeout, local_timeout())
+    for key, value in items.items():
+        local_cache.set(key, (expires, value))
+
+
+def local_timeout():
+    return getattr(settings, "CONDUIT_LOCAL_CACHE_TIMEOUT", 60)
+
+
+def get_topics(topic_ids):
+    """
+    Cached detail representations of the given topics keyed by topic id, and
+    the topic versions to pass to `set_topics` for the missing ones.
+    """
+    versions = get_versions([TOPIC_KEY.format(topic_id) for topic_id in topic_ids])
+    keys = {
+        versioned(TOPIC_KEY.format(topic_id), versions[TOPIC_KEY.format(topic_id)]): topic_id
+        for topic_id in topic_ids
+    }
+    return {keys[key]: data for key, data in tiered_get(keys).items()}, versions
+
+
+def set_topics(topics_data, versions):
+    """
+    Cache detail representations given as {topic id: data}, under the
+    versions read before they were loaded. The latest representation of each
+    topic is also kept unversioned for a grace period, to be served while a
+    fresh one is being computed.
+    """
+    shared = {
+        topic_id: {k: v for k, v in data.items() if k not in VIEWER_FIELDS}
+        for topic_id, data in topics_data.items()
+    }
+    tiered_set(
+        {
+            versioned(TOPIC_KEY.format(topic_id), versions[TOPIC_KEY.format(topic_id)]): data
+            for topic_id, data in shared.items()
+        },
+        topic_timeout(),
+    )
+    cache.set_many(
+        {STALE_KEY.format(TOPIC_KEY.format(topic_id)): data for topic_id, data in shared.items()},
+        topic_timeout() + getattr(settings, "CONDUIT_CACHE_STALE_GRACE", 60),
+    )
+
+
+def load_topics(topic_ids, load):
+    """
+    Detail representations of the given topics keyed by id, from the cache or
+    computed with `load(ids) -> {id: data}`. Concurrent misses of a topic are
+    coalesced: one caller loads it, the others serve its previous
+    representation, or else wait for the fresh one. Unknown ids are left out.
+    """
+    found, versions = get_topics(topic_ids)
+    missing = [topic_id for topic_id in topic_ids if topic_id not in found]
+    if not missing:
+        return found
+
+    keys = {
+        versioned(TOPIC_KEY.format(topic_id), versions[TOPIC_KEY.format(topic_id)]): topic_id
+        for topic_id in missing
+    }
+    led, followed, busy = single_flight.claim(keys)
+    fresh = None
+    try:
+        if led:
+            fresh = load([keys[key] for key in led])
+            set_topics(fresh, versions)
+    finally:
+        for key in led:
+            single_flight.land(key, None if fresh is None else fresh.get(keys[key], NOT_FOUND))
+    found.update(fresh or {})
+
+    waiting = [*followed, *busy]
+    stale = cache.get_many([STALE_KEY.format(TOPIC_KEY.format(keys[key])) for key in waiting])
+    for key in waiting:
+        data = stale.get(STALE_KEY.format(TOPIC_KEY.format(keys[key])))
+        if data is not None:
+            found[keys[key]] = data
+
+    settled = {keys[key] for key in led}
+    for key, flight in followed.items():
+        if keys[key] not in found:
+            data = single_flight.wait(flight)
+            if data is NOT_FOUND:
+                settled.add(keys[key])
+            elif data is not None:
+                found[keys[key]] = data
+
+    pending = [key for key in busy if keys[key] not in found]
+    if pending:
+        found.update((keys[key], data) for key, data in poll(tiered_get, pending).items())
+
+    # Whatever the other callers failed to provide is loaded directly.
+    left = [i for i in missing if i not in found and i not in settled]
+    if left:
+        fresh = load(left)
+        set_topics(fresh, versions)
+        found.update(fresh)
+    return found
+
+
+def invalidate_topic(topic_id):
+    bump(TOPIC_KEY.format(topic_id), "topics")
+
+
+def invalidate_topic_lists():
+    bump("topics")
+
+
+def invalidate_user_topics(user_id):
+    """
+    Invalidate the topic lists and the details of the topics a user wrote or
+    commented on, which embed them, after a profile change or deletion.
+    Their stale copies are dropped too, so that a deleted user's topics and
+    comments aren't served while being reloaded.
+    """
+    topic_ids = set(Topic.all_objects.filter(user=user_id).values_list("pk", flat=True))
+    topic_ids.update(
+        Comment.all_objects.filter(user=user_id).values_list("topic", flat=True).distinct()
+    )
+    bump("topics", *(TOPIC_KEY.format(topic_id) for topic_id in topic_ids))
+    stale = [STALE_KEY.format(TOPIC_KEY.format(topic_id)) for topic_id in topic_ids]
+    transaction.on_commit(lambda: cache.delete_many(stale))
+
+
+def get_list(family, url):
+    """
+    Cached list response body of `url` for a family ("topics", "tags"), and
+    the family version to pass to `set_list` on a miss.
+    """
+    version = get_version(family)
+    key = versioned("{}:{}".format(family, url), version)
+    return tiered_get([key]).get(key), version
+
+
+def set_list(family, url, version, body):
+    key = versioned("{}:{}".format(family, url), version)
+    tiered_set({key: body}, getattr(settings, "CONDUIT_LIST_CACHE_TIMEOUT", 60))
+
+
+def profile_key(username):
+    return PROFILE_KEY.format(quote(username, safe=""))
+
+
+def get_profile(username):
+    """
+    Cached `{"_id", "data"}` of a username, `{"_id": None}` for a username
+    known not to exist, or None on a cache miss; and the profile version to
+    pass to `set_profile`.
+    """
+    version = get_version(profile_key(username))
+    key = versioned(profile_key(username), version)
+    return tiered_get([key]).get(key), version
+
+
+def set_profile(username, version, user_id, data=None):
+    """
+    Cache the profile of a username, or that it doesn't exist when `user_id`
+    is None, for a shorter time so that sign-ups show up quickly.
+    """
+    key = versioned(profile_key(username), version)
+    if user_id is None:
+        tiered_set({key: {"_id": None}}, getattr(settings, "CONDUIT_PROFILE_MISSING_TIMEOUT", 30))
+        return
+
+    data = {k: v for k, v in data.items() if k not in PROFILE_FRESH_FIELDS}
+    timeout = getattr(settings, "CONDUIT_PROFILE_CACHE_TIMEOUT", 300)
+    tiered_set({key: {"_id": user_id, "data": data}}, timeout)
+
+
+def invalidate_profile(*usernames):
+    bump(*(profile_key(username) for username in usernames))
@@ -0,0 +1,89 @@
+import threading
+import time
+from django.conf import settings
+from django.core.cache import cache
+
+LEASE_KEY = "lease:{}"
+
+
+class Flight(object):
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+
+
+class SingleFlight(object):
+    """
+    Coalesce the recomputation of cache keys: the first caller of a key in a
+    process becomes its leader, later callers of that process wait for the
+    leader's value, and a lease in the shared cache elects one leader among
+    processes. Callers that lose the lease to another process are told so,
+    to serve a stale value or wait for the fresh one to be cached.
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def claim(self, keys):
+        """
+        Return `(led, followed, busy)`: the keys this caller must compute and
+        `land()`, {key: Flight} to `wait()` for, and the keys leased by
+        another process.
+        """
+        led, followed = [], {}
+        with self._lock:
+            for key in keys:
+                if key in self._flights:
+                    followed[key] = self._flights[key]
+                else:
+                    self._flights[key] = Flight()
+                    led.append(key)
+
+        lease = getattr(settings, "CONDUIT_CACHE_LEASE", 5)
+        leased = []
+        busy = []
+        for key in led:
+            if cache.add(LEASE_KEY.format(key), 1, lease):
+                leased.append(key)
+            else:
+                busy.append(key)
+                self.land(key, None, leased=False)
+        return leased, followed, busy
+
+    def land(self, key, value, leased=True):
+        """
+        Hand the value of a led key to the waiting callers, None if it
+        couldn't be computed, and release its lease.
+        """
+        with self._lock:
+            flight = self._flights.pop(key, None)
+        if flight is not None:
+            flight.value = value
+            flight.event.set()
+        if leased:
+            cache.delete(LEASE_KEY.format(key))
+
+    def wait(self, flight):
+        flight.event.wait(getattr(settings, "CONDUIT_CACHE_LEASE", 5))
+        return flight.value
+
+
+def poll(get, keys):
+    """
+    Wait up to CONDUIT_CACHE_WAIT seconds for another process to cache
+    `keys`, return what `get(keys)` found by then as {key: value}.
+    """
+    deadline = time.monotonic() + getattr(settings, "CONDUIT_CACHE_WAIT", 0.5)
+    found = {}
+    pending = list(keys)
+    while pending:
+        found.update(get(pending))
+        pending = [key for key in pending if key not in found]
+        if not pending or time.monotonic() >= deadline:
+            break
+        time.sleep(0.05)
+    return found
+
+
+single_flight = SingleFlight()
@@ -0,0 +1,145 @@
+from django.db.models import Count, F, Max
+from django.utils import timezone
+from api.models import Comment, Favorite, Topic, UserStats
+
+
+def adjust_comment_count(topic_id, delta):
+    """
+    Atomically shift the denormalized comment counter of one topic.
+    """
+    Topic.objects.filter(pk=topic_id).update(comment_count=F("comment_count") + delta)
+
+
+def release_comment_counts(comments):
+    """
+    Decrement the counters of every topic and author touched by a set of
+    comments that is about to be deleted, with one UPDATE per distinct count.
+    """
+    rows = comments.values("topic").annotate(n=Count("pk")).values_list("topic", "n")
+    for n, topic_ids in group_by_count(rows).items():
+        Topic.objects.filter(pk__in=topic_ids).update(comment_count=F("comment_count") - n)
+
+    rows = comments.values("user").annotate(n=Count("pk")).values_list("user", "n")
+    release_user_stats("comment_count", rows)
+
+
+def release_favorite_counts(favorites):
+    """
+    Decrement the given / received favorite stats of the users touched by a
+    set of favorites that is about to be deleted.
+    """
+    rows = favorites.values("user").annotate(n=Count("pk")).values_list("user", "n")
+    release_user_stats("favorites_given", rows)
+    rows = favorites.values("topic__user").annotate(n=Count("pk")).values_list("topic__user", "n")
+    release_user_stats("favorites_received", rows)
+
+
+def group_by_count(rows):
+    by_count = {}
+    for pk, n in rows:
+        by_count.setdefault(n, []).append(pk)
+    return by_count
+
+
+def adjust_user_stats(user_id, active=False, **deltas):
+    """
+    Atomically shift the profile counters of one user, e.g.
+    `adjust_user_stats(user_id, topic_count=1)`, and mark the user as active
+    now when `active` is set. A missing stats row is rebuilt from the tables.
+    """
+    values = {name: F(name) + delta for name, delta in deltas.items()}
+    if active:
+        values["last_active"] = timezone.now()
+    if not UserStats.objects.filter(user=user_id).update(**values):
+        reconcile_user_stats([user_id])
+        if active:
+            UserStats.objects.filter(user=user_id).update(last_active=values["last_active"])
+
+
+def release_user_stats(field, rows):
+    for n, user_ids in group_by_count(rows).items():
+        UserStats.objects.filter(user__in=user_ids).update(**{field: F(field) - n})
+
+
+def reconcile_comment_counts(topic_ids):
+    """
+    Recompute the comment counter of the given topics from the comment table.
+    Return the number of topics whose counter had drifted.
+    """
+    actual = dict(
+        Comment.objects.filter(topic__in=topic_ids)
+        .values("topic")
+        .annotate(n=Count("pk"))
+        .values_list("topic", "n")
+    )
+    fixed = 0
+    for topic_id, stored in Topic.objects.filter(pk__in=topic_ids).values_list(
+        "pk", "comment_count"
+    ):
+        count = actual.get(topic_id, 0)
+        if stored != count:
+            Topic.objects.filter(pk=topic_id).update(comment_count=count)
+            fixed += 1
+    return fixed
+
+
+def count_by(queryset, field):
+    return dict(queryset.values(field).annotate(n=Count("pk")).values_list(field, "n"))
+
+
+def reconcile_user_stats(user_ids):
+    """
+    Recompute the profile counters of the given users from the topic,
+    comment and favorite tables, creating missing stats rows. Deleted topics
+    stay counted in comments and favorites until their purge job has run,
+    like the topic counters. Return the number of rows fixed or created.
+    """
+    actual = {
+        "comment_count": count_by(Comment.all_objects.filter(user__in=user_ids), "user"),
+        "favorites_given": count_by(Favorite.objects.filter(user__in=user_ids), "user"),
+        "favorites_received": count_by(
+            Favorite.objects.filter(topic__user__in=user_ids), "topic__user"
+        ),
+        "topic_count": count_by(Topic.objects.filter(user__in=user_ids), "user"),
+    }
+
+    fixed = 0
+    stored = UserStats.objects.filter(user__in=user_ids).values("user", *UserStats.COUNTERS)
+    missing = set(user_ids)
+    for row in stored:
+        user_id = row["user"]
+        missing.discard(user_id)
+        counts = {name: actual[name].get(user_id, 0) for name in UserStats.COUNTERS}
+        if any(row[name] != counts[name] for name in counts):
+            UserStats.objects.filter(user=user_id).update(**counts)
+            fixed += 1
+
+    if missing:
+        last_active = latest_activity(missing)
+        created = UserStats.objects.bulk_create(
+            [
+                UserStats(
+                    last_active=last_active.get(user_id),
+                    user_id=user_id,
+                    **{name: actual[name].get(user_id, 0) for name in UserStats.COUNTERS},
+                )
+                for user_id in missing
+            ],
+            ignore_conflicts=True,
+        )
+        fixed += len(created)
+    return fixed
+
+
+def latest_activity(user_ids):
+    latest = {}
+    for queryset in (
+        Comment.all_objects.filter(user__in=user_ids),
+        Favorite.objects.filter(user__in=user_ids),
+        Topic.all_objects.filter(user__in=user_ids),
+    ):
+        rows = queryset.values("user").annotate(at=Max("create_at")).values_list("user", "at")
+        for user_id, at in rows:
+            if user_id not in latest or at > latest[user_id]:
+                latest[user_id] = at
+    return latest
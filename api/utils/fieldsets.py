@@ -0,0 +1,136 @@
+import copy
+from django.db.models import Prefetch
+from rest_framework.relations import ManyRelatedField, PrimaryKeyRelatedField
+from rest_framework.serializers import BaseSerializer, ListSerializer
+
+
+def parse_fieldset(value):
+    """
+    Turn "title,user.username,user.bio" into a nested dict:
+    {"title": {}, "user": {"username": {}, "bio": {}}}
+    """
+    if isinstance(value, dict):
+        return value
+
+    tree = {}
+    for path in (value or "").split(","):
+        node = tree
+        for name in filter(None, (part.strip() for part in path.split("."))):
+            node = node.setdefault(name, {})
+    return tree
+
+
+def fieldset_kwargs(request, default_omit=None):
+    """
+    Read `?fields=`, `?omit=` and `?expand=` from the request as serializer
+    kwargs. `default_omit` is left out unless the client lists `?fields=`.
+    """
+    fields = request.query_params.get("fields")
+    omit = request.query_params.get("omit")
+    if default_omit and not fields:
+        omit = ",".join(filter(None, (omit, default_omit)))
+
+    return {"fields": fields, "omit": omit, "expand": request.query_params.get("expand")}
+
+
+class SparseFieldsetMixin(object):
+    """
+    Serializer mixin accepting `fields` / `omit` / `expand` kwargs, either
+    comma-separated strings with dotted paths into nested serializers or
+    already parsed trees. Fields named in `optional_fields` are only rendered
+    when they are listed in `fields` or `expand`.
+    """
+
+    optional_fields = ()
+
+    def __init__(self, *args, **kwargs):
+        include = parse_fieldset(kwargs.pop("fields", None))
+        exclude = parse_fieldset(kwargs.pop("omit", None))
+        expand = parse_fieldset(kwargs.pop("expand", None))
+        super().__init__(*args, **kwargs)
+
+        if self.optional_fields:
+            for name in self.optional_fields:
+                self.fields.pop(name, None)
+        if include or exclude or expand:
+            self.apply_fieldset(include, exclude, expand)
+
+    def apply_fieldset(self, include, exclude, expand):
+        for name in self.optional_fields:
+            if name in include or name in expand:
+                self.fields[name] = copy.deepcopy(self._declared_fields[name])
+
+        for name in list(self.fields):
+            if include and name not in include:
+                self.fields.pop(name)
+                continue
+            if name in exclude and not exclude[name]:
+                self.fields.pop(name)
+                continue
+
+            subtrees = [tree.get(name) or {} for tree in (include, exclude, expand)]
+            if any(subtrees):
+                nested = getattr(self.fields[name], "child", self.fields[name])
+                if isinstance(nested, SparseFieldsetMixin):
+                    nested.apply_fieldset(*subtrees)
+
+    @classmethod
+    def plan(cls, queryset, fields=None, omit=None, expand=None, extra=()):
+        """
+        Trim `queryset` down to what this serializer renders for the given
+        fieldset: only() the selected columns, select_related() nested
+        objects and prefetch many-relations only when they are selected.
+        `extra` lists columns the caller needs regardless, e.g. a cursor key.
+        """
+        return plan_queryset(queryset, cls(fields=fields, omit=omit, expand=expand), extra)
+
+
+def plan_queryset(queryset, serializer, extra=()):
+    serializer = getattr(serializer, "child", serializer)
+    only, select, prefetch = _plan(serializer, queryset.model, "")
+    only.extend(extra)
+
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    return queryset.only(*only)
+
+
+def _plan(serializer, model, prefix):
+    model_fields = {f.name: f for f in model._meta.get_fields()}
+    only = [prefix + model._meta.pk.name]
+    select = []
+    prefetch = []
+
+    for field in serializer.fields.values():
+        if field.write_only or field.source == "*" or "." in field.source:
+            continue
+
+        model_field = model_fields.get(field.source)
+        if model_field is None:
+            continue
+
+        lookup = prefix + field.source
+        if isinstance(field, (ListSerializer, ManyRelatedField)):
+            related = model_field.related_model._default_manager.all()
+            if isinstance(field, ListSerializer):
+                # Reverse foreign keys need the FK column to attach the rows.
+                extra = (model_field.field.name,) if model_field.one_to_many else ()
+                related = plan_queryset(related, field.child, extra)
+            elif isinstance(field.child_relation, PrimaryKeyRelatedField):
+                related = related.only(related.model._meta.pk.name)
+            prefetch.append(Prefetch(lookup, queryset=related))
+        elif isinstance(field, BaseSerializer):
+            only.append(lookup)
+            select.append(lookup)
+            sub_only, sub_select, sub_prefetch = _plan(
+                field, model_field.related_model, lookup + "__"
+            )
+            only.extend(sub_only)
+            select.extend(sub_select)
+            prefetch.extend(sub_prefetch)
+        elif not model_field.many_to_many and not model_field.one_to_many:
+            only.append(lookup)
+
+    return only, select, prefetch
@@ -0,0 +1,29 @@
+"""
+Functions run by the password pool processes. This module is imported before
+Django is set up in them, so it must not import models.
+"""
+
+import time
+from django.contrib.auth.hashers import check_password, make_password
+
+
+def init_worker():
+    import django
+
+    django.setup()
+
+
+def timed_make(password):
+    start = time.perf_counter()
+    return make_password(password), time.perf_counter() - start
+
+
+def timed_check(password, encoded):
+    """
+    Check `password` against `encoded`, also hashing it again when `encoded`
+    uses an outdated hasher or iteration count, all in one round-trip.
+    """
+    start = time.perf_counter()
+    updated = []
+    valid = check_password(password, encoded, setter=lambda raw: updated.append(make_password(raw)))
+    return (valid, updated[0] if updated else None), time.perf_counter() - start
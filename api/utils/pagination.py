@@ -1,5 +1,5 @@
 from rest_framework import status
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 from rest_framework.response import Response
 
 
@@ -26,3 +26,31 @@ class CustomPagination(PageNumberPagination):
             res["user"] = user
 
         return Response(res)
+
+
+class CommentCursorPagination(CursorPagination):
+    """
+    Cursor pagination over `(create_at, _id)`, newest first by default.
+    Pass `?order=asc` for the oldest-first mode.
+    """
+
+    page_size = 20
+    page_size_query_param = "size"
+    max_page_size = 100
+    order_query_param = "order"
+
+    def get_ordering(self, request, queryset, view):
+        if request.query_params.get(self.order_query_param) == "asc":
+            return ("create_at", "_id")
+        return ("-create_at", "-_id")
+
+    def get_paginated_response(self, data, *args, **kwargs):
+        return Response(
+            {
+                "code": status.HTTP_200_OK,
+                "data": data,
+                "msg": kwargs.get("msg"),
+                "next": self.get_next_link(),
+                "prev": self.get_previous_link(),
+            }
+        )
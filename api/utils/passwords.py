@@ -0,0 +1,165 @@
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from api.utils.hashers import init_worker, timed_check, timed_make
+
+
+class PasswordPoolBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Too many password checks in progress, retry later."
+    default_code = "password_pool_busy"
+
+    def __init__(self):
+        super().__init__()
+        # Sent as `Retry-After` by DRF's exception handler.
+        self.wait = getattr(settings, "CONDUIT_PASSWORD_RETRY_AFTER", 1)
+
+
+class PasswordPool(object):
+    """
+    Process pool hashing and checking passwords off the request workers, so
+    that PBKDF2 runs on every core instead of holding the GIL of the worker
+    serving the request. At most CONDUIT_PASSWORD_QUEUE_SIZE calls wait for a
+    free process; callers that can't get in within
+    CONDUIT_PASSWORD_QUEUE_TIMEOUT seconds get PasswordPoolBusy. With
+    CONDUIT_PASSWORD_WORKERS set to 0, passwords are hashed in the caller.
+    """
+
+    def __init__(self):
+        self._executor = None
+        self._slots = None
+        self._lock = threading.Lock()
+        self.metrics = {
+            "completed": 0,
+            "failed": 0,
+            "in_flight": 0,
+            "rehashed": 0,
+            "rejected": 0,
+            "run_seconds": 0.0,
+            "wait_seconds": 0.0,
+        }
+
+    def workers(self):
+        workers = getattr(settings, "CONDUIT_PASSWORD_WORKERS", None)
+        return os.cpu_count() or 1 if workers is None else workers
+
+    def executor(self):
+        with self._lock:
+            if self._executor is None:
+                workers = self.workers()
+                queue_size = getattr(settings, "CONDUIT_PASSWORD_QUEUE_SIZE", 32)
+                self._slots = threading.BoundedSemaphore(workers + queue_size)
+                self._executor = ProcessPoolExecutor(
+                    workers, mp_context=get_context("spawn"), initializer=init_worker
+                )
+            return self._executor, self._slots
+
+    def reset(self, executor):
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False)
+
+    def count(self, **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                self.metrics[name] += delta
+
+    def run(self, func, *args):
+        if self.workers() == 0:
+            result, elapsed = func(*args)
+            self.count(completed=1, run_seconds=elapsed)
+            return result
+
+        executor, slots = self.executor()
+        start = time.perf_counter()
+        if not slots.acquire(timeout=getattr(settings, "CONDUIT_PASSWORD_QUEUE_TIMEOUT", 2)):
+            self.count(rejected=1)
+            raise PasswordPoolBusy()
+
+        self.count(in_flight=1)
+        try:
+            result, elapsed = executor.submit(func, *args).result()
+        except BrokenProcessPool:
+            # A worker died; the next call starts a new pool.
+            self.reset(executor)
+            self.count(failed=1)
+            raise
+        finally:
+            slots.release()
+            self.count(in_flight=-1)
+        self.count(
+            completed=1, run_seconds=elapsed, wait_seconds=time.perf_counter() - start - elapsed
+        )
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {**self.metrics, "workers": self.workers()}
+
+
+password_pool = PasswordPool()
+
+
+def hash_password(password):
+    return password_pool.run(timed_make, password)
+
+
+def verify_password(password, user):
+    """
+    Check the password of `user`, storing it hashed again when its hash is
+    outdated.
+    """
+    valid, updated = password_pool.run(timed_check, password, user.password)
+    if updated is not None:
+        user.password = updated
+        type(user).all_objects.filter(pk=user.pk).update(password=updated)
+        password_pool.count(rehashed=1)
+    return valid
+
+
+def hash_passwords(passwords):
+    """
+    Hash `passwords` on all the pool processes at once, in order.
+    """
+    workers = password_pool.workers()
+    if workers == 0 or len(passwords) < 2:
+        return [hash_password(password) for password in passwords]
+    with ThreadPoolExecutor(min(workers, len(passwords))) as threads:
+        return list(threads.map(hash_password, passwords))
+
+
+ahash_password = sync_to_async(hash_password, thread_sensitive=False)
+averify_password = sync_to_async(verify_password)
+
+
+class PasswordPoolBackend(ModelBackend):
+    """
+    ModelBackend checking passwords in the password pool.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # Take as long as a wrong password, not to tell which users exist.
+            hash_password(password)
+            return None
+        if verify_password(password, user) and self.user_can_authenticate(user):
+            return user
+        return None
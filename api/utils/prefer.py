@@ -0,0 +1,30 @@
+from django.conf import settings
+
+LEAN = "lean"
+FULL = "full"
+
+PREFER_MODES = {
+    "return=minimal": LEAN,
+    "return=representation": FULL,
+}
+
+
+def write_response_mode(request):
+    """
+    Resolve the response mode of a mutation: `?response=lean|full` first, then
+    the `Prefer` header (RFC 7240), then `settings.CONDUIT_WRITE_RESPONSE`.
+    """
+    mode = request.query_params.get("response")
+    if mode in (LEAN, FULL):
+        return mode
+
+    for token in request.headers.get("Prefer", "").split(","):
+        mode = PREFER_MODES.get(token.strip().lower())
+        if mode:
+            return mode
+
+    return getattr(settings, "CONDUIT_WRITE_RESPONSE", FULL)
+
+
+def is_lean(request):
+    return write_response_mode(request) == LEAN
@@ -0,0 +1,84 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from api.models import User, UserStats
+from api.serializers import UserProvisionSerializer
+from api.utils.cache import invalidate_profile
+from api.utils.passwords import hash_passwords
+
+
+def provision_users(rows):
+    """
+    Create users from `rows` of UserProvisionSerializer input, with one query
+    checking the e-mails and usernames of the whole batch, passwords hashed
+    in parallel and one bulk insert. Return the created users as
+    {"_id", "email", "username"} and the rejected rows as {"index", "error"}.
+    """
+    errors = []
+    valid = []
+    for i, row in enumerate(rows):
+        ser = UserProvisionSerializer(data=row)
+        if ser.is_valid():
+            valid.append((i, ser.validated_data))
+        else:
+            errors.append({"index": i, "error": ser.errors})
+
+    emails = set()
+    usernames = set()
+    if valid:
+        emails_in = {data["email"] for _, data in valid}
+        usernames_in = {data["username"] for _, data in valid}
+        for email, username in User.all_objects.filter(
+            Q(email__in=emails_in) | Q(username__in=usernames_in)
+        ).values_list("email", "username"):
+            emails.add(email)
+            usernames.add(username)
+
+    # Rows are also checked against the earlier rows of the batch.
+    accepted = []
+    for i, data in valid:
+        error = {}
+        if data["email"] in emails:
+            error["email"] = ["E-mail already exists."]
+        if data["username"] in usernames:
+            error["username"] = ["Username already exists."]
+        if error:
+            errors.append({"index": i, "error": error})
+            continue
+        emails.add(data["email"])
+        usernames.add(data["username"])
+        accepted.append((i, data))
+
+    hashes = hash_passwords([data["password"] for _, data in accepted])
+    users = [User(**{**data, "password": h}) for (_, data), h in zip(accepted, hashes)]
+    created = []
+    with transaction.atomic():
+        # Rows taken by a concurrent request since the check are skipped,
+        # and told apart from ours by their salted password hash.
+        User.all_objects.bulk_create(
+            users,
+            batch_size=getattr(settings, "CONDUIT_PROVISION_BATCH_SIZE", 500),
+            ignore_conflicts=True,
+        )
+        stored = {
+            row["email"]: row
+            for row in User.all_objects.filter(email__in=[user.email for user in users]).values(
+                "_id", "email", "password", "username"
+            )
+        }
+        for (i, _), user in zip(accepted, users):
+            row = stored.get(user.email)
+            if row is None or row["password"] != user.password:
+                errors.append({"index": i, "error": {"non_field_errors": ["User already exists."]}})
+            else:
+                created.append({k: row[k] for k in ("_id", "email", "username")})
+
+        # bulk_create sends no post_save, create the stats rows here.
+        UserStats.objects.bulk_create(
+            [UserStats(user_id=user["_id"]) for user in created], ignore_conflicts=True
+        )
+
+    if created:
+        invalidate_profile(*(user["username"] for user in created))
+    errors.sort(key=lambda error: error["index"])
+    return created, errors
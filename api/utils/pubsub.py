@@ -0,0 +1,185 @@
+import asyncio
+import json
+import threading
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils.module_loading import import_string
+from api.utils.versions import get_version, increment
+
+
+class Subscription(object):
+    """
+    Bounded queue of events for one stream, fed from any thread. A consumer
+    too slow to keep up loses events rather than holding memory.
+    """
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.queue = asyncio.Queue(getattr(settings, "CONDUIT_EVENTS_QUEUE_SIZE", 100))
+
+    def put(self, event):
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            pass  # The stream's loop is closed.
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            pass
+
+    async def get(self, timeout):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+class LocalBroker(object):
+    """
+    Deliver events to the subscribers of this process only, enough for a
+    single ASGI process.
+    """
+
+    def __init__(self):
+        self._channels = {}
+        self._lock = threading.Lock()
+
+    def publish(self, channel, event):
+        self.deliver(channel, event)
+
+    def deliver(self, channel, event):
+        with self._lock:
+            subscriptions = list(self._channels.get(channel, ()))
+        for subscription in subscriptions:
+            subscription.put(event)
+
+    def subscribe(self, channel):
+        subscription = Subscription(asyncio.get_running_loop())
+        with self._lock:
+            self._channels.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, channel, subscription):
+        with self._lock:
+            subscriptions = self._channels.get(channel, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self._channels.pop(channel, None)
+
+
+class CacheBroker(LocalBroker):
+    """
+    Deliver events across processes and nodes through the shared cache: each
+    event is stored under a per-channel sequence number, and one poller per
+    channel and process fans the new ones out to the local subscribers.
+    Sequence numbers are version counters, incremented in the database
+    rather than with the cache's `incr`, which isn't atomic on every
+    backend, and they never go back when the cache evicts them.
+    """
+
+    SEQ_NAME = "events:{}"
+    EVENT_KEY = "events:{}:{}"
+
+    def __init__(self):
+        super().__init__()
+        self._pollers = {}
+
+    def publish(self, channel, event):
+        seq = increment(self.SEQ_NAME.format(channel))
+        timeout = getattr(settings, "CONDUIT_EVENTS_TTL", 60)
+        cache.set(self.EVENT_KEY.format(channel, seq), event, timeout)
+
+    def subscribe(self, channel):
+        subscription = super().subscribe(channel)
+        with self._lock:
+            if channel not in self._pollers:
+                self._pollers[channel] = asyncio.get_running_loop().create_task(
+                    self.poll(channel)
+                )
+        return subscription
+
+    async def poll(self, channel):
+        interval = getattr(settings, "CONDUIT_EVENTS_POLL", 1)
+        current = sync_to_async(get_version)
+        name = self.SEQ_NAME.format(channel)
+        try:
+            last = await current(name)
+            while self.keep_polling(channel):
+                await asyncio.sleep(interval)
+                seq = await current(name)
+                if seq < last:
+                    last = seq  # The counters were reset, catch up from here.
+                if seq <= last:
+                    continue
+
+                # A burst of more than 100 events between polls is truncated.
+                first = max(last + 1, seq - 100)
+                keys = [self.EVENT_KEY.format(channel, i) for i in range(first, seq + 1)]
+                found = await cache.aget_many(keys)
+                for k in keys:
+                    if k in found:
+                        self.deliver(channel, found[k])
+                last = seq
+        except BaseException:
+            with self._lock:
+                self._pollers.pop(channel, None)
+            raise
+
+    def keep_polling(self, channel):
+        # Checked and given up under the lock, so that a new subscriber
+        # either finds this poller running or starts another one.
+        with self._lock:
+            if self._channels.get(channel):
+                return True
+            self._pollers.pop(channel, None)
+            return False
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            path = getattr(settings, "CONDUIT_PUBSUB_BACKEND", "api.utils.pubsub.LocalBroker")
+            _broker = import_string(path)()
+    return _broker
+
+
+def publish(channel, kind, data):
+    """
+    Publish an event once the current transaction commits, so that streams
+    never announce a write that is rolled back.
+    """
+    event = {"data": data, "type": kind}
+    transaction.on_commit(lambda: broker().publish(channel, event))
+
+
+async def stream(channel):
+    """
+    Server-Sent Events of `channel`, with a comment line every
+    CONDUIT_EVENTS_HEARTBEAT seconds. The stream ends after
+    CONDUIT_EVENTS_MAX_AGE seconds and the client reconnects, which also
+    bounds streams whose client went away unnoticed.
+    """
+    heartbeat = getattr(settings, "CONDUIT_EVENTS_HEARTBEAT", 15)
+    deadline = time.monotonic() + getattr(settings, "CONDUIT_EVENTS_MAX_AGE", 300)
+    subscription = broker().subscribe(channel)
+    try:
+        yield "retry: 3000\n\n"
+        while time.monotonic() < deadline:
+            try:
+                event = await subscription.get(heartbeat)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            yield "event: {}\ndata: {}\n\n".format(
+                event["type"], json.dumps(event["data"], cls=DjangoJSONEncoder)
+            )
+    finally:
+        broker().unsubscribe(channel, subscription)
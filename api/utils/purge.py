@@ -0,0 +1,140 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from api.models import Comment, Favorite, PurgeJob, Topic, User
+from api.utils.counters import (
+    adjust_user_stats,
+    release_comment_counts,
+    release_favorite_counts,
+)
+from api.utils.tasks import enqueue
+
+
+def batch_size():
+    return getattr(settings, "CONDUIT_PURGE_BATCH_SIZE", 500)
+
+
+def schedule_purge(kind, target_id, user=None):
+    """
+    Record a purge job and queue the task that runs it.
+    """
+    with transaction.atomic():
+        job = PurgeJob.objects.create(kind=kind, target_id=target_id, user=user)
+        enqueue("purge", {"job": job._id}, key="purge:{}".format(job._id))
+    return job
+
+
+def soft_delete_user(user, requester=None):
+    User.all_objects.filter(pk=user._id).update(delete_at=timezone.now())
+    return schedule_purge("user", user._id, requester)
+
+
+def soft_delete_topic(topic, requester=None):
+    with transaction.atomic():
+        Topic.all_objects.filter(pk=topic._id).update(delete_at=timezone.now())
+        adjust_user_stats(topic.user_id, topic_count=-1)
+        return schedule_purge("topic", topic._id, requester)
+
+
+def run_job(job_id):
+    """
+    Purge the dependents of a soft-deleted row in bounded batches, then the
+    row itself. Each batch commits on its own, so an interrupted job resumes
+    where it stopped when it is run again.
+    """
+    job = PurgeJob.objects.get(pk=job_id)
+    if job.status == "done":
+        return job
+
+    job.status = "running"
+    job.save(update_fields=["status", "update_at"])
+    try:
+        if job.kind == "user":
+            purge_user(job)
+        else:
+            purge_topic(job)
+    except Exception as e:
+        job.status = "failed"
+        job.error = str(e)
+        job.save(update_fields=["error", "status", "update_at"])
+        raise
+
+    job.status = "done"
+    job.save(update_fields=["status", "update_at"])
+    return job
+
+
+def purge_user(job):
+    user_id = job.target_id
+    drain(job, Comment.all_objects.filter(user=user_id), delete_comments)
+
+    topics = Topic.all_objects.filter(user=user_id).order_by("pk").values_list("pk", flat=True)
+    while True:
+        topic_ids = list(topics[: batch_size()])
+        if not topic_ids:
+            break
+        for topic_id in topic_ids:
+            purge_topic_rows(job, topic_id)
+
+    drain(job, Favorite.objects.filter(user=user_id), delete_favorites)
+    with transaction.atomic():
+        deleted, _ = User.all_objects.filter(pk=user_id).delete()
+        progress(job, deleted)
+
+
+def purge_topic(job):
+    purge_topic_rows(job, job.target_id)
+
+
+def purge_topic_rows(job, topic_id):
+    drain(job, Comment.all_objects.filter(topic=topic_id), delete_comments)
+    drain(job, Favorite.objects.filter(topic=topic_id), delete_topic_favorites)
+    drain(job, Topic.tags.through.objects.filter(topic=topic_id), delete_rows)
+    with transaction.atomic():
+        deleted, _ = Topic.all_objects.filter(pk=topic_id).delete()
+        progress(job, deleted)
+
+
+def drain(job, queryset, delete):
+    """
+    Delete `queryset` batch by batch, one transaction per batch.
+    """
+    size = batch_size()
+    model = queryset.model
+    while True:
+        ids = list(queryset.order_by("pk").values_list("pk", flat=True)[:size])
+        if not ids:
+            return
+
+        with transaction.atomic():
+            deleted = delete(model._base_manager.filter(pk__in=ids))
+            progress(job, deleted)
+
+
+def delete_rows(queryset):
+    deleted, _ = queryset.delete()
+    return deleted
+
+
+def delete_comments(queryset):
+    release_comment_counts(queryset)
+    return delete_rows(queryset)
+
+
+def delete_favorites(queryset):
+    # Only used for the favorites a user gave, so every topic appears once.
+    topic_ids = list(queryset.values_list("topic", flat=True))
+    Topic.all_objects.filter(pk__in=topic_ids).update(favorite=F("favorite") - 1)
+    return delete_topic_favorites(queryset)
+
+
+def delete_topic_favorites(queryset):
+    release_favorite_counts(queryset)
+    return delete_rows(queryset)
+
+
+def progress(job, deleted):
+    PurgeJob.objects.filter(pk=job._id).update(
+        deleted=F("deleted") + deleted, update_at=timezone.now()
+    )
@@ -0,0 +1,192 @@
+import heapq
+import math
+from collections import defaultdict
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Min, Q
+from api.models import RelatedTopic, Topic
+
+# Topics are sparse vectors over their tags, each tag weighted by its inverse
+# document frequency, and related topics are the nearest ones by cosine
+# similarity. Only the non-zero entries are ever stored: topic -> tags and
+# tag -> topics posting lists, so a topic is only compared with the topics it
+# shares at least one tag with.
+
+
+def top_k():
+    return getattr(settings, "CONDUIT_RELATED_TOP_K", 10)
+
+
+def max_tag_topics():
+    return getattr(settings, "CONDUIT_RELATED_MAX_TAG_TOPICS", 1000)
+
+
+def idf(total, df):
+    return math.log(1 + total / df)
+
+
+def norm(tags, weights):
+    return math.sqrt(sum(weights[tag] ** 2 for tag in tags))
+
+
+def tag_rows(**filters):
+    through = Topic.tags.through.objects.filter(topic__delete_at__isnull=True, **filters)
+    return through.values_list("topic_id", "tag_id")
+
+
+def similarities(topic_id, topic_tags, tag_topics, weights, norms):
+    """
+    Cosine similarity of `topic_id` with every topic sharing a tag with it.
+    Tags on more than CONDUIT_RELATED_MAX_TAG_TOPICS topics are too common to
+    tell much and are skipped when looking for candidates.
+    """
+    if not norms.get(topic_id):
+        return {}
+
+    dots = defaultdict(float)
+    for tag in topic_tags[topic_id]:
+        posting = tag_topics.get(tag, ())
+        if len(posting) > max_tag_topics():
+            continue
+        for other in posting:
+            if other != topic_id:
+                dots[other] += weights[tag] ** 2
+
+    return {
+        other: dot / (norms[topic_id] * norms[other])
+        for other, dot in dots.items()
+        if norms.get(other)
+    }
+
+
+def nearest(scores):
+    return heapq.nlargest(top_k(), scores.items(), key=lambda item: (item[1], -item[0]))
+
+
+def build(batch_size=1000):
+    """
+    Rebuild the whole related topics table from the topic-tag incidence,
+    committing `batch_size` topics at a time. Return the number of topics.
+    """
+    topic_tags = defaultdict(set)
+    tag_topics = defaultdict(set)
+    for topic_id, tag_id in tag_rows().iterator():
+        topic_tags[topic_id].add(tag_id)
+        tag_topics[tag_id].add(topic_id)
+
+    total = len(topic_tags)
+    weights = {tag: idf(total, len(topics)) for tag, topics in tag_topics.items()}
+    norms = {topic_id: norm(tags, weights) for topic_id, tags in topic_tags.items()}
+
+    topic_ids = sorted(topic_tags)
+    for start in range(0, len(topic_ids), batch_size):
+        chunk = topic_ids[start : start + batch_size]
+        rows = [
+            RelatedTopic(topic_id=topic_id, related_id=other, score=score)
+            for topic_id in chunk
+            for other, score in nearest(
+                similarities(topic_id, topic_tags, tag_topics, weights, norms)
+            )
+        ]
+        with transaction.atomic():
+            RelatedTopic.objects.filter(topic__in=chunk).delete()
+            RelatedTopic.objects.bulk_create(rows)
+
+    RelatedTopic.objects.filter(topic__tags__isnull=True).delete()
+    return total
+
+
+def refresh(topic_ids):
+    """
+    Recompute the related topics of the given topics after a write, and
+    offer them to the lists of their neighbours, which keep their top K.
+    Tag weights drift as topics are written; `build_related_topics` run
+    periodically brings every list back in line.
+    """
+    topic_tags = defaultdict(set)
+    tag_topics = defaultdict(set)
+    targets = set()
+    for topic_id, tag_id in tag_rows(topic__in=topic_ids):
+        targets.add(topic_id)
+        topic_tags[topic_id].add(tag_id)
+
+    target_tags = set().union(*topic_tags.values())
+    df = frequencies(target_tags)
+    common = {tag for tag, n in df.items() if n > max_tag_topics()}
+    for topic_id, tag_id in tag_rows(tag__in=target_tags - common):
+        tag_topics[tag_id].add(topic_id)
+
+    candidates = set().union(*tag_topics.values()) - targets
+    for topic_id, tag_id in tag_rows(topic__in=candidates):
+        topic_tags[topic_id].add(tag_id)
+    df.update(frequencies(set().union(*topic_tags.values()) - set(df)))
+
+    total = Topic.objects.filter(tags__isnull=False).distinct().count()
+    weights = {tag: idf(total, n) for tag, n in df.items()}
+    norms = {topic_id: norm(tags, weights) for topic_id, tags in topic_tags.items()}
+
+    rows = []
+    offers = defaultdict(dict)
+    for topic_id in targets:
+        scores = similarities(topic_id, topic_tags, tag_topics, weights, norms)
+        rows.extend(
+            RelatedTopic(topic_id=topic_id, related_id=other, score=score)
+            for other, score in nearest(scores)
+        )
+        for other, score in scores.items():
+            if other not in targets:
+                offers[other][topic_id] = score
+
+    with transaction.atomic():
+        RelatedTopic.objects.filter(Q(topic__in=topic_ids) | Q(related__in=topic_ids)).delete()
+        rows.extend(accepted(offers))
+        RelatedTopic.objects.bulk_create(rows)
+        trim(list(offers))
+
+
+def frequencies(tag_ids):
+    if not tag_ids:
+        return {}
+    counts = (
+        Topic.tags.through.objects.filter(tag__in=tag_ids, topic__delete_at__isnull=True)
+        .values("tag")
+        .annotate(n=Count("topic"))
+    )
+    return {row["tag"]: row["n"] for row in counts}
+
+
+def accepted(offers):
+    """
+    Back-links that make it into the current top K of their topic.
+    """
+    if not offers:
+        return []
+
+    current = (
+        RelatedTopic.objects.filter(topic__in=offers)
+        .values("topic")
+        .annotate(n=Count("pk"), low=Min("score"))
+    )
+    current = {row["topic"]: (row["n"], row["low"]) for row in current}
+    rows = []
+    for topic_id, scores in offers.items():
+        n, low = current.get(topic_id, (0, 0))
+        rows.extend(
+            RelatedTopic(topic_id=topic_id, related_id=other, score=score)
+            for other, score in scores.items()
+            if n < top_k() or score > low
+        )
+    return rows
+
+
+def trim(topic_ids):
+    over = (
+        RelatedTopic.objects.filter(topic__in=topic_ids)
+        .values("topic")
+        .annotate(n=Count("pk"))
+        .filter(n__gt=top_k())
+    )
+    for topic_id in [row["topic"] for row in over]:
+        keep = RelatedTopic.objects.filter(topic=topic_id).order_by("-score", "related")
+        keep_ids = list(keep.values_list("pk", flat=True)[: top_k()])
+        RelatedTopic.objects.filter(topic=topic_id).exclude(pk__in=keep_ids).delete()
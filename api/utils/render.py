@@ -0,0 +1,130 @@
+import hashlib
+import html
+import re
+import threading
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.fields import Field
+
+try:
+    import markdown
+except ImportError:  # pragma: no cover - optional dependency
+    markdown = None
+
+try:
+    import nh3
+except ImportError:  # pragma: no cover - optional dependency
+    nh3 = None
+
+SAFE_SCHEMES = ("http", "https", "mailto")
+URL_ATTR = re.compile(r'\b(href|src)="([^"]*)"', re.I)
+CONTROL_CHARS = re.compile(r"[\x00-\x20]+")
+URL_SCHEME = re.compile(r"^([a-z][a-z0-9+.-]*):", re.I)
+
+
+class LRUCache(object):
+    """
+    Small thread-safe in-process LRU mapping.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return default
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+local_cache = LRUCache(getattr(settings, "CONDUIT_MARKDOWN_LRU_SIZE", 1024))
+
+
+def content_key(content):
+    return "md:" + hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def render_markdown(content):
+    """
+    Markdown -> sanitized HTML, cached by content hash in the in-process LRU
+    first and in the shared cache backend second.
+    """
+    key = content_key(content)
+    rendered = local_cache.get(key)
+    if rendered is None:
+        rendered = cache.get(key)
+        if rendered is None:
+            rendered = sanitize(to_html(content))
+            cache.set(key, rendered, getattr(settings, "CONDUIT_MARKDOWN_CACHE_TIMEOUT", None))
+        local_cache.set(key, rendered)
+    return rendered
+
+
+def prerender_markdown(content):
+    """
+    Warm the render caches on write so the first reader doesn't pay for it.
+    """
+    if content and getattr(settings, "CONDUIT_MARKDOWN_PRERENDER", True):
+        render_markdown(content)
+
+
+def to_html(content):
+    if markdown is None:
+        paragraphs = re.split(r"\n\s*\n", html.escape(content.strip()))
+        return "\n".join(
+            "<p>{}</p>".format(p.replace("\n", "<br />")) for p in paragraphs if p
+        )
+
+    md = markdown.Markdown(extensions=["fenced_code", "tables"])
+    # Raw HTML in the source is rendered as text instead of passed through.
+    md.preprocessors.deregister("html_block")
+    md.inlinePatterns.deregister("html")
+    return md.convert(content)
+
+
+def sanitize(rendered):
+    if nh3 is not None:
+        return nh3.clean(rendered, url_schemes=set(SAFE_SCHEMES))
+    return URL_ATTR.sub(_safe_url_attr, rendered)
+
+
+def _safe_url_attr(match):
+    url = CONTROL_CHARS.sub("", html.unescape(match.group(2)))
+    scheme = URL_SCHEME.match(url)
+    if scheme and scheme.group(1).lower() not in SAFE_SCHEMES:
+        return '{}="#"'.format(match.group(1))
+    return match.group(0)
+
+
+class MarkdownField(Field):
+    """
+    Read-only field rendering a Markdown source attribute to HTML,
+    e.g. `content_html = MarkdownField(source="content")`.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        return render_markdown(value)
@@ -0,0 +1,211 @@
+import logging
+import threading
+import time
+import uuid
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from api.models import Task
+
+logger = logging.getLogger(__name__)
+
+TaskSpec = namedtuple("TaskSpec", ["func", "batch", "max_attempts"])
+
+registry = {}
+
+
+def task(kind, batch=False, max_attempts=5):
+    """
+    Register a task handler under `kind`. Handlers take the task payload, or
+    a list of payloads when `batch` is set, so that pending tasks of the same
+    kind are processed with one call.
+
+    Delivery is at least once: a task is retried after a failure, and one
+    whose lease expires is claimed again while the first run may still be
+    going. Handlers must be idempotent.
+    """
+
+    def decorator(func):
+        registry[kind] = TaskSpec(func, batch, max_attempts)
+        return func
+
+    return decorator
+
+
+def enqueue(kind, payload=None, key=None, delay=0):
+    """
+    Queue a task in the current transaction, it becomes visible to workers
+    when the transaction commits. A task with the same idempotency `key` is
+    only queued once; the existing one is returned instead.
+    """
+    spec = registry[kind]
+    fields = {
+        "kind": kind,
+        "max_attempts": spec.max_attempts,
+        "payload": payload or {},
+        "run_at": timezone.now() + timedelta(seconds=delay),
+    }
+    if key is None:
+        t = Task.objects.create(**fields)
+    else:
+        try:
+            with transaction.atomic():
+                t = Task.objects.create(key=key, **fields)
+        except IntegrityError:
+            return Task.objects.get(key=key)
+
+    if getattr(settings, "CONDUIT_TASK_INPROCESS_WORKER", False):
+        transaction.on_commit(inprocess_worker().wake)
+    return t
+
+
+def backoff(attempts):
+    return min(2**attempts, getattr(settings, "CONDUIT_TASK_MAX_BACKOFF", 600))
+
+
+class Worker(object):
+    """
+    Claim due tasks from the table and run them on a thread pool. Claiming is
+    a conditional UPDATE, so several workers, in-process or `run_worker`
+    commands, can share one table without a broker.
+    """
+
+    def __init__(self, threads=4, batch_size=50, lease=None):
+        self.batch_size = batch_size
+        self.lease = lease or getattr(settings, "CONDUIT_TASK_LEASE", 300)
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="task")
+
+    def claim(self):
+        now = timezone.now()
+        expired = now - timedelta(seconds=self.lease)
+        due = Q(status="pending", run_at__lte=now) | Q(status="running", locked_at__lt=expired)
+        due_ids = Task.objects.filter(due).order_by("run_at").values_list("pk", flat=True)
+        ids = list(due_ids[: self.batch_size])
+        if not ids:
+            return []
+
+        token = uuid.uuid4().hex
+        Task.objects.filter(due, pk__in=ids).update(
+            attempts=F("attempts") + 1,
+            locked_at=now,
+            locked_by=token,
+            status="running",
+        )
+        return list(Task.objects.filter(locked_by=token, status="running"))
+
+    def run_once(self):
+        """
+        Run one claimed batch to completion, return the number of tasks.
+        """
+        tasks = self.claim()
+        groups = {}
+        for t in tasks:
+            spec = registry.get(t.kind)
+            if spec is not None and spec.batch:
+                groups.setdefault(t.kind, []).append(t)
+            else:
+                groups[t._id] = [t]
+
+        wait([self.executor.submit(self.execute, group) for group in groups.values()])
+        return len(tasks)
+
+    def run_forever(self, poll=1.0):
+        while True:
+            if not self.run_once():
+                time.sleep(poll)
+
+    def execute(self, tasks):
+        close_old_connections()
+        try:
+            spec = registry.get(tasks[0].kind)
+            if spec is None:
+                raise LookupError("Unknown task kind '{}'.".format(tasks[0].kind))
+
+            if spec.batch:
+                spec.func([t.payload for t in tasks])
+            else:
+                spec.func(tasks[0].payload)
+        except Exception as e:
+            logger.exception("Task %s failed.", ", ".join(str(t) for t in tasks))
+            for t in tasks:
+                self.fail(t, e)
+        else:
+            for token, ids in self.leases(tasks).items():
+                owned = Task.objects.filter(pk__in=ids, locked_by=token, status="running")
+                # Keyed tasks are kept so that their key keeps deduplicating.
+                owned.filter(key__isnull=True).delete()
+                owned.update(status="done", error="")
+        finally:
+            connection.close()
+
+    def leases(self, tasks):
+        """
+        Group the ids of `tasks` by the token they were claimed with. Updates
+        are made on rows still holding that token only, so a run outliving
+        its lease doesn't overwrite the state of the worker that took over.
+        """
+        leases = {}
+        for t in tasks:
+            leases.setdefault(t.locked_by, []).append(t._id)
+        return leases
+
+    def fail(self, t, error):
+        if t.attempts < t.max_attempts:
+            status = "pending"
+            run_at = timezone.now() + timedelta(seconds=backoff(t.attempts))
+        else:
+            status = "failed"
+            run_at = t.run_at
+        updated = Task.objects.filter(pk=t._id, locked_by=t.locked_by, status="running").update(
+            error=repr(error), run_at=run_at, status=status
+        )
+        if not updated:
+            logger.warning("Task %s lost its lease before failing.", t)
+
+
+class InProcessWorker(Worker):
+    """
+    Worker living in the web process, woken up when tasks are committed, so
+    small deployments don't need a separate `run_worker` process.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.event = threading.Event()
+        self.thread = threading.Thread(target=self.loop, name="task-loop", daemon=True)
+        self.thread.start()
+
+    def wake(self):
+        self.event.set()
+
+    def loop(self):
+        poll = getattr(settings, "CONDUIT_TASK_INPROCESS_POLL", 5)
+        while True:
+            # Also wake up periodically to pick up retries and delayed tasks.
+            self.event.wait(poll)
+            self.event.clear()
+            try:
+                while self.run_once():
+                    pass
+            except Exception:
+                logger.exception("In-process task worker failed.")
+            finally:
+                connection.close()
+
+
+_inprocess = None
+_inprocess_lock = threading.Lock()
+
+
+def inprocess_worker():
+    global _inprocess
+    with _inprocess_lock:
+        if _inprocess is None:
+            _inprocess = InProcessWorker(
+                threads=getattr(settings, "CONDUIT_TASK_INPROCESS_THREADS", 2)
+            )
+    return _inprocess
@@ -0,0 +1,45 @@
+import math
+import re
+
+EXCERPT_LENGTH = 200
+WORDS_PER_MINUTE = 200
+
+MARKDOWN_PATTERNS = (
+    (re.compile(r"```.*?```", re.S), " "),
+    (re.compile(r"!\[([^\]]*)\]\([^)]*\)"), r"\1"),
+    (re.compile(r"\[([^\]]*)\]\([^)]*\)"), r"\1"),
+    (re.compile(r"^\s{0,3}(#{1,6}|>|[-*+]|\d+\.)\s+", re.M), ""),
+    (re.compile(r"[*_`~]+"), ""),
+    (re.compile(r"<[^>]+>"), ""),
+    (re.compile(r"\s+"), " "),
+)
+
+
+def plain_text(content):
+    """
+    Strip the most common Markdown syntax, leaving readable text.
+    """
+    text = content or ""
+    for pattern, repl in MARKDOWN_PATTERNS:
+        text = pattern.sub(repl, text)
+    return text.strip()
+
+
+def make_excerpt(content, length=EXCERPT_LENGTH):
+    text = plain_text(content)
+    if len(text) <= length:
+        return text
+
+    cut = text[:length]
+    space = cut.rfind(" ")
+    if space > length // 2:
+        cut = cut[:space]
+    return cut.rstrip(" ,.;:") + "…"
+
+
+def reading_time(content):
+    """
+    Estimated reading time in minutes, at least one.
+    """
+    words = len(re.findall(r"\w+", plain_text(content)))
+    return max(1, math.ceil(words / WORDS_PER_MINUTE))
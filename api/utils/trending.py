@@ -0,0 +1,84 @@
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+from api.models import Topic, TrendingEpoch
+from api.utils.tasks import enqueue
+
+# Scores are stored as `weight * 2 ** ((t - epoch) / half_life)` summed over
+# events. Every topic grows by the same factor as time passes, so comparing
+# stored scores ranks topics by their decayed score without ever rewriting
+# old rows. Rescaling only moves the epoch forward to keep the numbers small.
+
+DEFAULT_WEIGHTS = {
+    "comment": 0.5,
+    "favorite": 1.0,
+    "uncomment": -0.5,
+    "unfavorite": -1.0,
+}
+
+# Half-lives since the epoch after which a boost queues a rescale, and after
+# which it rescales first, before `2 ** x` grows too large for a float
+# (x > 1023) and every boost fails.
+RESCALE_AFTER = 32
+RESCALE_NOW_AFTER = 512
+
+
+def half_life():
+    return getattr(settings, "CONDUIT_TRENDING_HALF_LIFE", 60 * 60 * 24)
+
+
+def current_epoch():
+    latest = TrendingEpoch.objects.order_by("-_id").first()
+    if latest is None:
+        latest = TrendingEpoch.objects.create(epoch=timezone.now())
+    return latest.epoch
+
+
+def growth(epoch, now):
+    return 2 ** ((now - epoch).total_seconds() / half_life())
+
+
+def boost(topic_id, event, at=None):
+    """
+    Add one `event` ("favorite", "unfavorite", "comment") to a topic's score,
+    weighted as of `at`, now by default. Undoing an event passes the time it
+    happened, to take back exactly what it added.
+    """
+    weights = getattr(settings, "CONDUIT_TRENDING_WEIGHTS", DEFAULT_WEIGHTS)
+    epoch = current_epoch()
+    half_lives = (timezone.now() - epoch).total_seconds() / half_life()
+    if half_lives > RESCALE_NOW_AFTER:
+        rescale()
+        epoch = current_epoch()
+    elif half_lives > RESCALE_AFTER:
+        enqueue("rescale_trending", key="rescale_trending:{}".format(epoch.isoformat()))
+    delta = weights[event] * growth(epoch, at or timezone.now())
+    Topic.objects.filter(pk=topic_id).update(trending_score=F("trending_score") + delta)
+
+
+def rescale(batch_size=1000):
+    """
+    Move the epoch to now and divide every stored score by the growth since
+    the previous epoch, in primary-key batches. Return the number of topics.
+    Boosts landing on a topic while its batch is pending are slightly
+    undersized; run it often enough (e.g. daily) for that to stay negligible.
+    """
+    now = timezone.now()
+    # 2 ** -x, which underflows to 0 rather than overflowing like 1 / 2 ** x.
+    factor = 2 ** -((now - current_epoch()).total_seconds() / half_life())
+    TrendingEpoch.objects.create(epoch=now)
+
+    topics = Topic.all_objects.exclude(trending_score=0).order_by("pk")
+    last_id = 0
+    rescaled = 0
+    while True:
+        topic_ids = list(topics.filter(pk__gt=last_id).values_list("pk", flat=True)[:batch_size])
+        if not topic_ids:
+            break
+
+        Topic.all_objects.filter(pk__in=topic_ids).update(
+            trending_score=F("trending_score") * factor
+        )
+        rescaled += len(topic_ids)
+        last_id = topic_ids[-1]
+    return rescaled
@@ -0,0 +1,89 @@
+import time
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from api.models import CacheVersion
+
+# Every cached family has a version counter: one per topic ("topic:1") and
+# per profile ("profile:alice"), one for all topic lists ("topics") and one
+# for the tag list ("tags"). Cache entries are keyed on the version they were
+# built from, so bumping a counter invalidates them on every node at once,
+# local caches included, without deleting or broadcasting anything. Stale
+# entries simply expire.
+#
+# Counters are incremented in the database, where increments are atomic on
+# every backend, and copied to the shared cache for reads. A counter missing
+# from the cache is read back from the database, so eviction never resets it.
+
+VERSION_KEY = "v:{}"
+
+
+def initial():
+    # New counters start above any value an older deployment kept in the cache.
+    return int(time.time() * 1000)
+
+
+def get_versions(names):
+    """
+    Current versions of the given names as {name: version}.
+    """
+    keys = {VERSION_KEY.format(name): name for name in names}
+    found = cache.get_many(keys)
+    missing = [name for key, name in keys.items() if key not in found]
+    if missing:
+        stored = dict(
+            CacheVersion.objects.filter(name__in=missing).values_list("name", "version")
+        )
+        for name in missing:
+            key = VERSION_KEY.format(name)
+            version = stored.get(name, 0)
+            if not cache.add(key, version, None):
+                version = max(version, cache.get(key, version))
+            found[key] = version
+    return {keys[key]: version for key, version in found.items()}
+
+
+def get_version(name):
+    return get_versions([name])[name]
+
+
+def increment(name):
+    """
+    Move a version forward and return it. Call it outside of transactions,
+    or readers may cache old rows under the new version; `bump` does.
+    """
+    counters = CacheVersion.objects.filter(name=name)
+    with transaction.atomic():
+        if not counters.update(version=F("version") + 1):
+            try:
+                with transaction.atomic():
+                    CacheVersion.objects.create(name=name, version=initial())
+            except IntegrityError:
+                counters.update(version=F("version") + 1)
+        version = counters.values_list("version", flat=True).get()
+
+    key = VERSION_KEY.format(name)
+    cache.set(key, version, None)
+    # Concurrent increments may reach the cache in any order. Each one checks
+    # the database after its write, so the last writer leaves the highest.
+    latest = counters.values_list("version", flat=True).get()
+    if latest > version:
+        cache.set(key, latest, None)
+    return version
+
+
+def bump(*names):
+    """
+    Move the given versions forward once the current transaction commits, so
+    that no node can cache the old rows under the new version.
+    """
+
+    def incr():
+        for name in names:
+            increment(name)
+
+    transaction.on_commit(incr)
+
+
+def versioned(key, version):
+    return "{}@{}".format(key, version)
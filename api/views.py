@@ -1,5 +1,10 @@
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.http import JsonResponse, StreamingHttpResponse
 from rest_framework import status
 from rest_framework.permissions import (
+    AllowAny,
     IsAdminUser,
     IsAuthenticated,
     IsAuthenticatedOrReadOnly,
@@ -8,18 +13,49 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.reverse import reverse
 from rest_framework.viewsets import ViewSet
-from api.models import Comment, Tag, Topic, User
+from api.models import Comment, Favorite, PurgeJob, Tag, Topic, User, UserStats
 from api.serializers import (
     CommentReadSerializer,
     CommentWriteSerializer,
+    PurgeJobSerializer,
     TagSerializer,
     TopicReadSerializer,
     TopicWriteSerializer,
     UserReadSerializer,
+    UserStatsSerializer,
     UserWriteSerializer,
+    favorited_context,
+    favorited_ids,
 )
-from api.utils.pagination import CustomPagination
+from api.utils.autocomplete import tag_index
+from api.utils.batch import BatchError, parse_items, run_batch
+from api.utils.cache import (
+    VIEWER_FIELDS,
+    get_list,
+    get_profile,
+    invalidate_profile,
+    invalidate_topic,
+    invalidate_topic_lists,
+    invalidate_user_topics,
+    load_topics,
+    set_list,
+    set_profile,
+)
+from api.utils.counters import adjust_comment_count, adjust_user_stats
+from api.utils.fieldsets import fieldset_kwargs
+from api.utils.pagination import CommentCursorPagination, CustomPagination
+from api.utils.passwords import password_pool
 from api.utils.permisson import IsAdminOrOwner, IsAdminOrSelf
+from api.utils.prefer import is_lean
+from api.utils.provision import provision_users
+from api.utils.pubsub import publish, stream
+from api.utils.purge import soft_delete_topic, soft_delete_user
+from api.utils.tasks import enqueue
+from api.utils.trending import boost
+
+# Topic lists serve the stored excerpt, the full content is only loaded when
+# a client asks for it with `?fields=`.
+LIST_OMIT = "content"
 
 
 @api_view(["GET"])
@@ -31,50 +67,210 @@ def api_root(request, format=None):
     """
     return Response(
         [
+            {"batch": reverse("batch", request=request, format=format)},
+            {"password-metrics": reverse("password-metrics", request=request, format=format)},
             {"topics": reverse("topic-list", request=request, format=format)},
+            {"topics-trending": reverse("topic-trending", request=request, format=format)},
             {"topic-detail": "http://localhost:8000/api/topic/1/"},
             {"topic-favor": "http://localhost:8000/api/topic/1/favor/"},
+            {"topic-related": "http://localhost:8000/api/topic/1/related/"},
             {"topic-comment": "http://localhost:8000/api/topic/1/comment/"},
+            {"topic-events": "http://localhost:8000/api/topic/1/events/"},
             {"my-settings": reverse("settings", request=request, format=format)},
             {"my-topics": reverse("my-own-topics", request=request, format=format)},
             {"my-favorites": reverse("my-favorite-topics", request=request, format=format)},
             {"users": reverse("user-list", request=request, format=format)},
+            {"users-bulk": reverse("user-bulk", request=request, format=format)},
             {"user-detail": "http://localhost:8000/api/user/admin/"},
             {"user-topics": "http://localhost:8000/api/profile/admin/"},
             {"user-favorites": "http://localhost:8000/api/profile/admin/favorites/"},
             {"tags": reverse("tag-list", request=request, format=format)},
+            {"tags-autocomplete": reverse("tag-autocomplete", request=request, format=format)},
             {"tag-detail": "http://localhost:8000/api/tag/conduit/"},
         ]
     )
 
 
+@api_view(["GET"])
+@permission_classes((IsAdminUser,))
+def password_metrics(request):
+    """
+    Password metrics:
+    Return the password pool counters of the process serving the request.
+    """
+    return Response(
+        {
+            "code": status.HTTP_200_OK,
+            "data": password_pool.stats(),
+            "msg": "Password metrics query succeed.",
+        }
+    )
+
+
+@api_view(["POST"])
+@permission_classes((AllowAny,))
+def batch(request):
+    """
+    Batch:
+    Run several API calls in one round-trip, authenticated once. Each
+    sub-request still checks its own permissions. Pure-read batches run in
+    parallel with `"parallel": true`, example:
+    {
+        "parallel": true,
+        "requests": [
+            {"id": "topic", "method": "GET", "path": "/api/topic/1/"},
+            {"id": "tags", "method": "GET", "path": "/api/tags/?size=20"}
+        ]
+    }
+    """
+    try:
+        items = parse_items(request.data)
+    except BatchError as e:
+        return Response(
+            {
+                "code": status.HTTP_400_BAD_REQUEST,
+                "error": str(e),
+                "msg": "Batch request failed.",
+            }
+        )
+
+    data = run_batch(request, items, parallel=bool(request.data.get("parallel")))
+    return Response({"code": status.HTTP_200_OK, "data": data, "msg": "Batch request succeed."})
+
+
+async def topic_events(request, pk):
+    """
+    Topic events:
+    Server-Sent Events stream of a topic, served by an ASGI server. Emits
+    `comment` with each new comment, `comment_deleted` with `{"_id"}` and
+    `favorite` with `{"favorite_count"}`, so clients don't need to poll.
+    """
+    if not await Topic.objects.filter(pk=pk).aexists():
+        return JsonResponse({"code": status.HTTP_404_NOT_FOUND, "msg": "Topic not found."})
+
+    response = StreamingHttpResponse(
+        stream("topic:{}".format(pk)), content_type="text/event-stream"
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
 def fetch_topics(request, username=None, favor=False):
+    """
+    Page of the topics of a user, or of its favorites, with the user's
+    profile. Return None when `username` doesn't exist.
+    """
     if username is not None:
-        user = User.objects.get(username=username)
+        profile = load_profile(username)
+        if profile is None:
+            return None
+        user_id, user_data = profile
     else:
-        user = request.user
+        user_id, user_data = request.user._id, UserReadSerializer(request.user).data
 
     if favor:
-        favorites = User.objects.get(_id=user._id).favorites.all()
-        favorite_ids = [f._id for f in favorites]
-        print("User's favorite topics id: {}\n".format(favorite_ids))
-        topics_all = Topic.objects.filter(_id__in=favorite_ids).order_by("-create_at")
-        total = len(favorite_ids)
+        # Single join against the (user, -create_at) index of the Favorite
+        # table, newest favorite first.
+        topics_all = Topic.objects.filter(favorited_by__user=user_id).order_by(
+            "-favorited_by__create_at", "-favorited_by___id"
+        )
     else:
-        topics_all = Topic.objects.filter(user=user._id).order_by("-create_at")
-        total = Topic.objects.filter(user=user._id).count()
+        topics_all = Topic.objects.filter(user=user_id).order_by("-create_at")
 
+    fieldset = fieldset_kwargs(request, default_omit=LIST_OMIT)
+    topics_all = TopicReadSerializer.plan(topics_all, **fieldset)
     page = CustomPagination()
     topics = page.paginate_queryset(topics_all, request)
-    ser_topics = TopicReadSerializer(topics, many=True)
-    ser_user = UserReadSerializer(user)
-    return (page, ser_topics.data, total, ser_user.data)
+    # The paginator has counted the topics already.
+    total = page.page.paginator.count
+    ser_topics = TopicReadSerializer(
+        topics, many=True, context=favorited_context(request, topics), **fieldset
+    )
+    return (page, ser_topics.data, total, user_data)
+
+
+def load_profile(username):
+    """
+    `(user id, profile data)` of a live user from the profile cache, or None
+    for an unknown username, which is cached too. Stats are read fresh.
+    """
+    profile, version = get_profile(username)
+    if profile is None:
+        try:
+            user = User.objects.select_related("stats").get(username=username)
+        except User.DoesNotExist:
+            set_profile(username, version, None)
+            return None
+
+        data = UserReadSerializer(user).data
+        set_profile(username, version, user._id, data)
+        return user._id, data
+
+    if profile["_id"] is None:
+        return None
+
+    stats = UserStats.objects.filter(user=profile["_id"]).first()
+    data = dict(profile["data"], stats=UserStatsSerializer(stats).data if stats else None)
+    return profile["_id"], data
+
+
+def serialize_topics(request, topic_ids):
+    """
+    Detail representations of the given topics keyed by id. Without a custom
+    fieldset they're served from the topic cache, and only the missing ones
+    are loaded with one planned queryset. Unknown ids are left out.
+    """
+    fieldset = fieldset_kwargs(request)
+    cacheable = not any(fieldset.values())
+
+    def load(ids):
+        topics = list(TopicReadSerializer.plan(Topic.objects.filter(pk__in=ids), **fieldset))
+        context = {"favorited_ids": frozenset()}
+        ser = TopicReadSerializer(topics, many=True, context=context, **fieldset)
+        return {topic._id: data for topic, data in zip(topics, ser.data)}
+
+    found = load_topics(topic_ids, load) if cacheable else load(topic_ids)
+
+    # Cached entries never carry per-viewer fields, add them for this viewer.
+    viewer_ids = [i for i, data in found.items() if cacheable or "favorited" in data]
+    if viewer_ids:
+        favorited = favorited_ids(request, viewer_ids)
+        for topic_id in viewer_ids:
+            found[topic_id] = dict(found[topic_id], favorited=topic_id in favorited)
+    return found
+
+
+def cached_list(request, family, build):
+    """
+    List response body for the full request URL from the list cache of
+    `family`, built with `build()` on a miss. Per-viewer fields are cached
+    without their value and filled in for the current viewer.
+    """
+    url = request.build_absolute_uri()
+    entry, version = get_list(family, url)
+    if entry is None:
+        body = build()
+        items = body["data"]
+        viewer = any(name in item for item in items for name in VIEWER_FIELDS)
+        if not viewer or all("_id" in item for item in items):
+            shared = [{k: v for k, v in item.items() if k not in VIEWER_FIELDS} for item in items]
+            set_list(family, url, version, {"body": dict(body, data=shared), "viewer": viewer})
+        return body
+
+    body = entry["body"]
+    if entry["viewer"]:
+        favorited = favorited_ids(request, [item["_id"] for item in body["data"]])
+        data = [dict(item, favorited=item["_id"] in favorited) for item in body["data"]]
+        body = dict(body, data=data)
+    return body
 
 
 class CommentViewSet(ViewSet):
     """
     GET list:
-    Return a list of all the comments for the specified topic.
+    Return a cursor-paginated list of the comments for the specified topic,
+    newest first, or oldest first with `?order=asc`.
 
     GET retrieve:
     Return the specified comment instance.
@@ -84,6 +280,8 @@ class CommentViewSet(ViewSet):
     {
         "content": "This is a comment."
     }
+    Return the whole topic, or only the new comment with `?response=lean`
+    or `Prefer: return=minimal`.
 
     DELETE destroy:
     Delete the specified comment instance.
@@ -105,23 +303,23 @@ class CommentViewSet(ViewSet):
         except Topic.DoesNotExist:
             return Response({"code": status.HTTP_404_NOT_FOUND, "msg": "Topic not found."})
 
-        comments = topic.comments.all()
-        ser = CommentReadSerializer(comments, many=True)
-        return Response(
-            {
-                "code": status.HTTP_200_OK,
-                "data": ser.data,
-                "msg": "Topic comments query succeed.",
-            }
+        fieldset = fieldset_kwargs(request)
+        comments_all = CommentReadSerializer.plan(
+            topic.comments.all(), extra=("create_at",), **fieldset
         )
+        page = CommentCursorPagination()
+        comments = page.paginate_queryset(comments_all, request, view=self)
+        ser = CommentReadSerializer(comments, many=True, **fieldset)
+        return page.get_paginated_response(ser.data, msg="Topic comments query succeed.")
 
     def retrieve(self, request, _id=None, pk=None):
+        fieldset = fieldset_kwargs(request)
         try:
-            comment = Comment.objects.get(pk=pk, topic=_id)
+            comment = CommentReadSerializer.plan(Comment.objects, **fieldset).get(pk=pk, topic=_id)
         except Comment.DoesNotExist:
             return Response({"code": status.HTTP_404_NOT_FOUND, "msg": "Comment not found."})
 
-        ser = CommentReadSerializer(comment)
+        ser = CommentReadSerializer(comment, **fieldset)
         return Response(
             {
                 "code": status.HTTP_200_OK,
@@ -148,12 +346,26 @@ class CommentViewSet(ViewSet):
                 }
             )
 
-        comment = ser.save()
-        topic.comments.add(comment)
+        with transaction.atomic():
+            comment = ser.save()
+            adjust_comment_count(topic._id, 1)
+            adjust_user_stats(comment.user_id, active=True, comment_count=1)
+            boost(topic._id, "comment")
+            publish("topic:{}".format(topic._id), "comment", CommentReadSerializer(comment).data)
+
+        invalidate_topic(topic._id)
+        enqueue("prerender_comments", {"comment": comment._id})
+
+        if is_lean(request):
+            data = CommentReadSerializer(comment).data
+        else:
+            topic.refresh_from_db(fields=["comment_count"])
+            data = TopicReadSerializer(topic, context=favorited_context(request, [topic])).data
+
         return Response(
             {
                 "code": status.HTTP_201_CREATED,
-                "data": TopicReadSerializer(topic).data,
+                "data": data,
                 "msg": "Topic comment creation succeed.",
             }
         )
@@ -168,8 +380,20 @@ class CommentViewSet(ViewSet):
             return Response({"code": status.HTTP_404_NOT_FOUND, "msg": "Comment not found."})
 
         self.check_object_permissions(request, comment)
-        topic.comments.remove(comment)
-        comment.delete()
+        with transaction.atomic():
+            comment_id = comment._id
+            # Counters are only released by the request that deleted the row.
+            _, deleted = comment.delete()
+            if not deleted.get(Comment._meta.label):
+                return Response(
+                    {"code": status.HTTP_404_NOT_FOUND, "msg": "Comment not found."}
+                )
+            adjust_comment_count(topic._id, -1)
+            adjust_user_stats(comment.user_id, comment_count=-1)
+            boost(topic._id, "uncomment", at=comment.create_at)
+            publish("topic:{}".format(topic._id), "comment_deleted", {"_id": comment_id})
+
+        invalidate_topic(topic._id)
         return Response(
             {
                 "code": status.HTTP_204_NO_CONTENT,
@@ -178,6 +402,31 @@ class CommentViewSet(ViewSet):
         )
 
 
+class PurgeJobViewSet(ViewSet):
+    """
+    GET retrieve:
+    Return the progress of the specified purge job.
+    """
+
+    permission_classes = (IsAuthenticated, IsAdminOrOwner)
+
+    def retrieve(self, request, pk=None):
+        try:
+            job = PurgeJob.objects.get(pk=pk)
+        except PurgeJob.DoesNotExist:
+            return Response({"code": status.HTTP_404_NOT_FOUND, "msg": "Purge job not found."})
+
+        self.check_object_permissions(request, job)
+        ser = PurgeJobSerializer(job)
+        return Response(
+            {
+                "code": status.HTTP_200_OK,
+                "data": ser.data,
+                "msg": "Purge job query succeed.",
+            }
+        )
+
+
 class TagViewSet(ViewSet):
     """
     GET list:
@@ -185,30 +434,48 @@ class TagViewSet(ViewSet):
 
     GET retrieve:
     Return the specified tag instance.
+
+    GET /api/tags/autocomplete/?q=<prefix> :
+    Return up to `?size=` tag names starting with the prefix, most used
+    first, from the in-process tag index.
     """
 
     permission_classes = (IsAuthenticatedOrReadOnly,)
 
     def list(self, request):
-        tags = Tag.objects.all().order_by("-create_at")
-        total = Tag.objects.count()
-        ser = TagSerializer(tags, many=True)
-        return Response(
-            {
+        def build():
+            fieldset = fieldset_kwargs(request)
+            tags = TagSerializer.plan(Tag.objects.all(), **fieldset).order_by("-create_at")
+            total = Tag.objects.count()
+            ser = TagSerializer(tags, many=True, **fieldset)
+            return {
                 "code": status.HTTP_200_OK,
                 "data": ser.data,
                 "msg": "Tags query succeed.",
                 "total": total,
             }
+
+        return Response(cached_list(request, "tags", build))
+
+    def autocomplete(self, request):
+        size = CustomPagination().get_page_size(request)
+        matches = tag_index.complete(request.query_params.get("q", ""), size)
+        return Response(
+            {
+                "code": status.HTTP_200_OK,
+                "data": [{"tag": name, "usage": usage} for name, usage in matches],
+                "msg": "Tags autocomplete succeed.",
+            }
         )
 
     def retrieve(self, request, tag):
+        fieldset = fieldset_kwargs(request)
         try:
-            tag = Tag.objects.get(tag=tag)
+            tag = TagSerializer.plan(Tag.objects, **fieldset).get(tag=tag)
         except Tag.DoesNotExist:
             return Response({"code": status.HTTP_404_NOT_FOUND, "msg": "Tag not found."})
 
-        ser = TagSerializer(tag)
+        ser = TagSerializer(tag, **fieldset)
         return Response(
             {
                 "code": status.HTTP_200_OK,
@@ -221,7 +488,8 @@ class TagViewSet(ViewSet):
 class TopicViewSet(ViewSet):
     """
     GET list:
-    Return a list of all the topics.
+    Return a list of all the topics. With `?ids=1,2,3` return those topics
+    in the requested order instead, plus the ids that weren't found.
 
     GET retrieve:
     Return the specified topic instance.
@@ -233,22 +501,39 @@ class TopicViewSet(ViewSet):
     Update a topic instance and return it.
 
     DELETE destroy:
-    Destroy a topic instance.
+    Hide a topic instance at once and return the purge job that removes it
+    and its comments in the background.
+
+    GET /api/topics/trending/ :
+    Return the top `?size=` topics by time-decayed favorites and comments.
 
     GET /api/my-topics/ :
     Return a list of all the topics created by the current user.
 
     GET /api/my-favorites/ :
-    Return a list of all the topics favorited by the current user.
+    Return a list of all the topics favorited by the current user, newest
+    favorite first.
 
     GET /api/profile/<username>/ :
     Return a list of all the topics created by the specified user.
 
     GET /api/profile/<username>/favorites/ :
-    Return a list of all the topics favorited by the specified user.
+    Return a list of all the topics favorited by the specified user, newest
+    favorite first.
 
     POST /api/topic/<topic_id>/favor/ :
-    Favor or unfavor the specified topic.
+    Favor or unfavor the specified topic. Return the whole topic, or only
+    `{"favorited", "favorite_count"}` with `?response=lean` or
+    `Prefer: return=minimal`.
+
+    GET /api/topic/<topic_id>/related/ :
+    Return the topics sharing the most tags with the specified topic, most
+    related first, from the precomputed related topics table.
+
+    Read endpoints accept `?fields=` / `?omit=` with comma-separated, dotted
+    field paths, e.g. `?fields=title,create_at,user.username`. Topic lists
+    leave `content` out unless it is listed in `?fields=`. Server-rendered
+    Markdown is added with `?expand=content_html,comments.content_html`.
 
     Create / Update request JSON example:
     {
@@ -281,28 +566,101 @@ class TopicViewSet(ViewSet):
         return super().get_permissions()
 
     def list(self, request):
-        topics_all = Topic.objects.all().order_by("-create_at")
-        total = Topic.objects.count()
-        page = CustomPagination()
-        topics = page.paginate_queryset(topics_all, request)
-        ser = TopicReadSerializer(topics, many=True)
-        return page.get_paginated_response(ser.data, msg="Topics query succeed.", total=total)
+        if "ids" in request.query_params:
+            return self.multi_get(request)
+
+        def build():
+            fieldset = fieldset_kwargs(request, default_omit=LIST_OMIT)
+            topics_all = Topic.objects.all().order_by("-create_at")
+            topics_all = TopicReadSerializer.plan(topics_all, **fieldset)
+            page = CustomPagination()
+            topics = page.paginate_queryset(topics_all, request)
+            total = page.page.paginator.count
+            context = favorited_context(request, topics)
+            ser = TopicReadSerializer(topics, many=True, context=context, **fieldset)
+            response = page.get_paginated_response(
+                ser.data, msg="Topics query succeed.", total=total
+            )
+            return response.data
+
+        return Response(cached_list(request, "topics", build))
 
     def retrieve(self, request, pk=None):
-        try:
-            topic = Topic.objects.get(pk=pk)
-        except Topic.DoesNotExist:
+        topic_id = int(pk)
+        data = serialize_topics(request, [topic_id]).get(topic_id)
+        if data is None:
             return Response({"code": status.HTTP_404_NOT_FOUND, "msg": "Topic not found."})
 
-        ser = TopicReadSerializer(topic)
         return Response(
             {
                 "code": status.HTTP_200_OK,
-                "data": ser.data,
+                "data": data,
                 "msg": "Topic query succeed.",
             }
         )
 
+    def trending(self, request):
+        page = CustomPagination()
+        size = page.get_page_size(request)
+        fieldset = fieldset_kwargs(request, default_omit=LIST_OMIT)
+        topics_all = Topic.objects.order_by("-trending_score", "-_id")
+        topics = list(TopicReadSerializer.plan(topics_all, **fieldset)[:size])
+        context = favorited_context(request, topics)
+        ser = TopicReadSerializer(topics, many=True, context=context, **fieldset)
+        return Response(
+            {
+                "code": status.HTTP_200_OK,
+                "data": ser.data,
+                "msg": "Trending topics query succeed.",
+            }
+        )
+
+    def related(self, request, pk=None):
+        if not Topic.objects.filter(pk=pk).exists():
+            return Response({"code": status.HTTP_404_NOT_FOUND, "msg": "Topic not found."})
+
+        fieldset = fieldset_kwargs(request, default_omit=LIST_OMIT)
+        topics_all = Topic.objects.filter(related_to_links__topic=pk).order_by(
+            "-related_to_links__score", "_id"
+        )
+        topics = list(TopicReadSerializer.plan(topics_all, **fieldset))
+        context = favorited_context(request, topics)
+        ser = TopicReadSerializer(topics, many=True, context=context, **fieldset)
+        return Response(
+            {
+                "code": status.HTTP_200_OK,
+                "data": ser.data,
+                "msg": "Related topics query succeed.",
+            }
+        )
+
+    def multi_get(self, request):
+        try:
+            topic_ids = [int(i) for i in request.query_params["ids"].split(",") if i.strip()]
+        except ValueError:
+            topic_ids = None
+
+        limit = getattr(settings, "CONDUIT_MULTIGET_MAX_IDS", 100)
+        if not topic_ids or len(topic_ids) > limit:
+            return Response(
+                {
+                    "code": status.HTTP_400_BAD_REQUEST,
+                    "error": "'ids' must be 1 to {} comma-separated topic ids.".format(limit),
+                    "msg": "Topics query failed.",
+                }
+            )
+
+        topic_ids = list(dict.fromkeys(topic_ids))
+        found = serialize_topics(request, topic_ids)
+        return Response(
+            {
+                "code": status.HTTP_200_OK,
+                "data": [found[i] for i in topic_ids if i in found],
+                "missing": [i for i in topic_ids if i not in found],
+                "msg": "Topics query succeed.",
+            }
+        )
+
     def create(self, request):
         tags_str = request.data.pop("tags")
         tags = []
@@ -321,7 +679,13 @@ class TopicViewSet(ViewSet):
                 }
             )
 
-        ser.save()
+        with transaction.atomic():
+            topic = ser.save()
+            adjust_user_stats(topic.user_id, active=True, topic_count=1)
+
+        invalidate_topic_lists()
+        enqueue("prerender_topics", {"topic": topic._id})
+        enqueue("refresh_related", {"topic": topic._id})
         return Response(
             {
                 "code": status.HTTP_201_CREATED,
@@ -355,7 +719,19 @@ class TopicViewSet(ViewSet):
                 }
             )
 
-        ser.save()
+        owner = topic.user_id
+        with transaction.atomic():
+            topic = ser.save()
+            if topic.user_id != owner:
+                adjust_user_stats(owner, topic_count=-1, favorites_received=-topic.favorite)
+                adjust_user_stats(
+                    topic.user_id, topic_count=1, favorites_received=topic.favorite
+                )
+            adjust_user_stats(topic.user_id, active=True)
+
+        invalidate_topic(topic._id)
+        enqueue("prerender_topics", {"topic": topic._id})
+        enqueue("refresh_related", {"topic": topic._id})
         return Response(
             {
                 "code": status.HTTP_200_OK,
@@ -371,8 +747,15 @@ class TopicViewSet(ViewSet):
             return Response({"code": status.HTTP_404_NOT_FOUND, "msg": "Topic not found."})
 
         self.check_object_permissions(request, topic)
-        topic.delete()
-        return Response({"code": status.HTTP_204_NO_CONTENT, "msg": "Topic delete succeed."})
+        job = soft_delete_topic(topic, request.user)
+        invalidate_topic(topic._id)
+        return Response(
+            {
+                "code": status.HTTP_202_ACCEPTED,
+                "data": PurgeJobSerializer(job).data,
+                "msg": "Topic delete succeed.",
+            }
+        )
 
     def my_topics(self, request):
         page, topics, total, user = fetch_topics(request)
@@ -387,12 +770,20 @@ class TopicViewSet(ViewSet):
         )
 
     def user_topics(self, request, username):
-        page, topics, total, user = fetch_topics(request, username)
+        result = fetch_topics(request, username)
+        if result is None:
+            return Response({"code": status.HTTP_404_NOT_FOUND, "msg": "User not found."})
+
+        page, topics, total, user = result
         msg = "User {}'s own topics query succeed.".format(username)
         return page.get_paginated_response(topics, msg=msg, total=total, user=user)
 
     def user_favorites(self, request, username):
-        page, topics, total, user = fetch_topics(request, username=username, favor=True)
+        result = fetch_topics(request, username=username, favor=True)
+        if result is None:
+            return Response({"code": status.HTTP_404_NOT_FOUND, "msg": "User not found."})
+
+        page, topics, total, user = result
         msg = "User {}'s favorite topics query succeed.".format(username)
         return page.get_paginated_response(topics, msg=msg, total=total, user=user)
 
@@ -403,19 +794,47 @@ class TopicViewSet(ViewSet):
             return Response({"code": status.HTTP_404_NOT_FOUND, "msg": "Topic not found."})
 
         user = request.user
-        if user.favorites.filter(pk=pk).exists():
-            user.favorites.remove(topic)
-            topic.favorite -= 1
-            topic.save()
-            msg = "Topic unfavor succeed."
+        with transaction.atomic():
+            # Serialize the favor toggles of a topic, so that the check below
+            # still holds when the favorite is added or removed.
+            list(Topic.all_objects.select_for_update().filter(pk=topic._id).values_list("pk"))
+            favorite = Favorite.objects.filter(user=user, topic=topic).first()
+            if favorite is not None:
+                user.favorites.remove(topic)
+                Topic.objects.filter(pk=pk).update(favorite=F("favorite") - 1)
+                adjust_user_stats(user._id, active=True, favorites_given=-1)
+                adjust_user_stats(topic.user_id, favorites_received=-1)
+                boost(topic._id, "unfavorite", at=favorite.create_at)
+                favorited = False
+                msg = "Topic unfavor succeed."
+            else:
+                try:
+                    with transaction.atomic():
+                        Favorite.objects.create(topic=topic, user=user)
+                except IntegrityError:
+                    added = False  # Favorited concurrently, by a path not taking the lock.
+                else:
+                    added = True
+                if added:
+                    Topic.objects.filter(pk=pk).update(favorite=F("favorite") + 1)
+                    adjust_user_stats(user._id, active=True, favorites_given=1)
+                    adjust_user_stats(topic.user_id, favorites_received=1)
+                    boost(topic._id, "favorite")
+                favorited = True
+                msg = "Topic favor succeed."
+
+        invalidate_topic(topic._id)
+        # The favoriter's profile lists its favorite topic ids.
+        invalidate_profile(user.username)
+        topic.refresh_from_db(fields=["favorite"])
+        publish("topic:{}".format(topic._id), "favorite", {"favorite_count": topic.favorite})
+        if is_lean(request):
+            data = {"favorited": favorited, "favorite_count": topic.favorite}
         else:
-            user.favorites.add(topic)
-            topic.favorite += 1
-            topic.save()
-            msg = "Topic favor succeed."
+            favorited_ids = {topic._id} if favorited else set()
+            data = TopicReadSerializer(topic, context={"favorited_ids": favorited_ids}).data
 
-        ser = TopicReadSerializer(topic)
-        return Response({"code": status.HTTP_200_OK, "data": ser.data, "msg": msg})
+        return Response({"code": status.HTTP_200_OK, "data": data, "msg": msg})
 
 
 class UserViewSet(ViewSet):
@@ -443,7 +862,18 @@ class UserViewSet(ViewSet):
     }
 
     DELETE destroy:
-    Destroy a user instance.
+    Hide a user instance at once and return the purge job that removes it,
+    its topics, comments and favorites in the background.
+
+    POST provision:
+    Create up to 1000 users at once, admin only, and return the created
+    users and the errors of the rejected rows by index, example:
+    {
+        "users": [
+            {"email": "a@qq.com", "username": "a", "password": "123456"},
+            {"email": "b@qq.com", "username": "b", "password": "123456"}
+        ]
+    }
 
     GET get_settings:
     Retrun the current user instance.
@@ -459,7 +889,7 @@ class UserViewSet(ViewSet):
     def get_permissions(self):
         self.permission_classes = (IsAuthenticated,)
 
-        if self.action == "destroy":
+        if self.action in ("destroy", "provision"):
             self.permission_classes += (IsAdminUser,)
         elif self.action == "update":
             self.permission_classes += (IsAdminOrSelf,)
@@ -467,24 +897,31 @@ class UserViewSet(ViewSet):
         return super().get_permissions()
 
     def list(self, request):
-        users_all = User.objects.all().order_by("-create_at")
+        fieldset = fieldset_kwargs(request)
+        users_all = UserReadSerializer.plan(User.objects.all(), **fieldset).order_by("-create_at")
         total = User.objects.count()
         page = CustomPagination()
         users = page.paginate_queryset(users_all, request)
-        ser = UserReadSerializer(users, many=True)
+        ser = UserReadSerializer(users, many=True, **fieldset)
         return page.get_paginated_response(ser.data, msg="Users query succeed.", total=total)
 
     def retrieve(self, request, username):
-        try:
-            user = User.objects.get(username=username)
-        except User.DoesNotExist:
+        fieldset = fieldset_kwargs(request)
+        if any(fieldset.values()):
+            users = UserReadSerializer.plan(User.objects, **fieldset)
+            user = users.filter(username=username).first()
+            data = user and UserReadSerializer(user, **fieldset).data
+        else:
+            profile = load_profile(username)
+            data = profile and profile[1]
+
+        if data is None:
             return Response({"code": status.HTTP_404_NOT_FOUND, "msg": "User not found."})
 
-        ser = UserReadSerializer(user)
         return Response(
             {
                 "code": status.HTTP_200_OK,
-                "data": ser.data,
+                "data": data,
                 "msg": "User info query succeed.",
             }
         )
@@ -501,6 +938,7 @@ class UserViewSet(ViewSet):
             )
 
         instance = ser.save()
+        invalidate_profile(instance.username)
         return Response(
             {
                 "code": status.HTTP_201_CREATED,
@@ -509,6 +947,32 @@ class UserViewSet(ViewSet):
             }
         )
 
+    def provision(self, request):
+        users = request.data.get("users") if isinstance(request.data, dict) else None
+        limit = getattr(settings, "CONDUIT_PROVISION_MAX_USERS", 1000)
+        if not isinstance(users, list) or not users or len(users) > limit:
+            return Response(
+                {
+                    "code": status.HTTP_400_BAD_REQUEST,
+                    "msg": "Expected 1 to {} users.".format(limit),
+                }
+            )
+
+        created, errors = provision_users(users)
+        if not created:
+            code = status.HTTP_400_BAD_REQUEST
+        elif errors:
+            code = status.HTTP_207_MULTI_STATUS
+        else:
+            code = status.HTTP_201_CREATED
+        return Response(
+            {
+                "code": code,
+                "data": {"created": created, "errors": errors},
+                "msg": "{} users created, {} rejected.".format(len(created), len(errors)),
+            }
+        )
+
     def update(self, request, username):
         try:
             user = User.objects.get(username=username)
@@ -527,6 +991,8 @@ class UserViewSet(ViewSet):
             )
 
         instance = ser.save()
+        invalidate_profile(instance.username)
+        invalidate_user_topics(instance._id)
         return Response(
             {
                 "code": status.HTTP_200_OK,
@@ -541,12 +1007,20 @@ class UserViewSet(ViewSet):
         except User.DoesNotExist:
             return Response({"code": status.HTTP_404_NOT_FOUND, "msg": "User not found."})
 
-        user.delete()
-        return Response({"code": status.HTTP_204_NO_CONTENT, "msg": "User delete succeed."})
+        job = soft_delete_user(user, request.user)
+        invalidate_profile(username)
+        invalidate_user_topics(user._id)
+        return Response(
+            {
+                "code": status.HTTP_202_ACCEPTED,
+                "data": PurgeJobSerializer(job).data,
+                "msg": "User delete succeed.",
+            }
+        )
 
     def get_settings(self, request):
         user = request.user
-        ser = UserReadSerializer(user)
+        ser = UserReadSerializer(user, **fieldset_kwargs(request))
         return Response(
             {
                 "code": status.HTTP_200_OK,
@@ -568,6 +1042,8 @@ class UserViewSet(ViewSet):
             )
 
         instance = ser.save()
+        invalidate_profile(instance.username)
+        invalidate_user_topics(instance._id)
         return Response(
             {
                 "code": status.HTTP_200_OK,
@@ -43,13 +43,16 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "api.middleware.AdmissionControlMiddleware",
     "django.middleware.security.SecurityMiddleware",
-    "django.contrib.sessions.middleware.SessionMiddleware",
+    # Skip bearer-token requests under /api/, see CONDUIT_API_FAST_PATH.
+    "api.middleware.ApiSessionMiddleware",
     "django.middleware.common.CommonMiddleware",
-    "django.middleware.csrf.CsrfViewMiddleware",
+    "api.middleware.ApiCsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
-    "django.contrib.messages.middleware.MessageMiddleware",
+    "api.middleware.ApiMessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "api.middleware.ResponseCacheMiddleware",
 ]
 
 ROOT_URLCONF = "conduit_drf.urls"
@@ -95,6 +98,20 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+# Shared by every process of this host; use Redis or Memcached when running
+# app servers on several hosts. Per-process caches are invalidated through
+# version counters incremented in the database and copied here.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": BASE_DIR / ".cache",
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -140,6 +157,8 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 AUTH_USER_MODEL = "api.User"
 
+AUTHENTICATION_BACKENDS = ["api.utils.passwords.PasswordPoolBackend"]
+
 
 LOGIN_REDIRECT_URL = "/api/"
 LOGOUT_REDIRECT_URL = "/api/"
@@ -171,3 +190,124 @@ SIMPLE_JWT = {
     "USER_ID_FIELD": "_id",
     "TOKEN_OBTAIN_SERIALIZER": "api.serializers.MyTokenObtainPairSerializer",
 }
+
+
+# Conduit
+
+# Body returned by comment creation and topic favor: "full" re-serializes the
+# whole topic, "lean" returns only the created comment or the favorite state.
+# Clients override it per request with `?response=` or `Prefer: return=...`.
+CONDUIT_WRITE_RESPONSE = "full"
+
+# Markdown rendering of `content_html`, cached by content hash.
+CONDUIT_MARKDOWN_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+CONDUIT_MARKDOWN_LRU_SIZE = 1024
+CONDUIT_MARKDOWN_PRERENDER = True
+
+# Rows deleted per transaction when purging a deleted user or topic.
+CONDUIT_PURGE_BATCH_SIZE = 500
+
+# Background tasks are stored in the Task table and run by `manage.py
+# run_worker`. The in-process worker also runs them on a small thread pool
+# inside each web process, woken up when a task is committed.
+CONDUIT_TASK_INPROCESS_WORKER = True
+CONDUIT_TASK_INPROCESS_THREADS = 2
+CONDUIT_TASK_INPROCESS_POLL = 5
+CONDUIT_TASK_LEASE = 300
+CONDUIT_TASK_MAX_BACKOFF = 600
+
+# `/api/batch/` limits.
+CONDUIT_BATCH_MAX_REQUESTS = 20
+CONDUIT_BATCH_MAX_WORKERS = 4
+
+# Topic detail cache, shared by `topic/<pk>/` and `topics/?ids=`.
+CONDUIT_TOPIC_CACHE_TIMEOUT = 300
+# Topic and tag list responses.
+CONDUIT_LIST_CACHE_TIMEOUT = 60
+# Per-process copy of the cached entries above, in front of CACHES.
+CONDUIT_LOCAL_CACHE_SIZE = 1024
+CONDUIT_LOCAL_CACHE_TIMEOUT = 60
+CONDUIT_MULTIGET_MAX_IDS = 100
+
+# Trending score: each favorite / comment weight halves every half-life (s).
+# Run `manage.py rescale_trending` periodically, e.g. daily; boosts also
+# queue a rescale once the epoch is 32 half-lives old.
+CONDUIT_TRENDING_HALF_LIFE = 60 * 60 * 24
+CONDUIT_TRENDING_WEIGHTS = {
+    "comment": 0.5,
+    "favorite": 1.0,
+    "uncomment": -0.5,
+    "unfavorite": -1.0,
+}
+
+# Related topics by shared tags, kept per topic. Tags on more topics than
+# CONDUIT_RELATED_MAX_TAG_TOPICS are ignored when looking for candidates.
+# Run `manage.py build_related_topics` periodically, e.g. daily.
+CONDUIT_RELATED_TOP_K = 10
+CONDUIT_RELATED_MAX_TAG_TOPICS = 1000
+
+# In-process tag autocomplete index, rebuilt from the database when older
+# than CONDUIT_TAG_INDEX_TTL seconds to pick up other processes' usage counts.
+# New tags elsewhere are noticed within CONDUIT_TAG_INDEX_CHECK seconds.
+CONDUIT_TAG_INDEX_TTL = 300
+CONDUIT_TAG_INDEX_CHECK = 1
+
+# Profile cache of `user/<username>/` and `profile/<username>/...`, unknown
+# usernames are cached for a shorter time.
+CONDUIT_PROFILE_CACHE_TIMEOUT = 300
+CONDUIT_PROFILE_MISSING_TIMEOUT = 30
+
+# Coalescing of topic cache misses: one caller per topic recomputes it under
+# a lease of CONDUIT_CACHE_LEASE seconds, the others serve the previous
+# representation, kept CONDUIT_CACHE_STALE_GRACE seconds past its timeout,
+# or wait up to CONDUIT_CACHE_WAIT seconds for the fresh one.
+CONDUIT_CACHE_LEASE = 5
+CONDUIT_CACHE_STALE_GRACE = 60
+CONDUIT_CACHE_WAIT = 0.5
+
+# Anonymous responses of topic / tag lists and topic details are cached
+# precompressed, bodies of CONDUIT_COMPRESS_MIN_SIZE bytes and more in gzip
+# and, with the `brotli` package installed, brotli too.
+CONDUIT_RESPONSE_CACHE_TIMEOUT = 60
+CONDUIT_COMPRESS_MIN_SIZE = 1024
+
+# Server-Sent Events of `topic/<pk>/events/`, served by an ASGI server, e.g.
+# `pdm run asgi`. LocalBroker delivers events within one process; use
+# "api.utils.pubsub.CacheBroker" to relay them through CACHES when running
+# several processes or nodes, polled every CONDUIT_EVENTS_POLL seconds. Its
+# sequence numbers are counted in the database, like cache versions.
+CONDUIT_PUBSUB_BACKEND = "api.utils.pubsub.LocalBroker"
+CONDUIT_EVENTS_HEARTBEAT = 15
+CONDUIT_EVENTS_MAX_AGE = 300
+CONDUIT_EVENTS_POLL = 1
+CONDUIT_EVENTS_QUEUE_SIZE = 100
+CONDUIT_EVENTS_TTL = 60
+
+# Admission control, per process: in-flight limits per route class, the
+# normal-class latency (s) past which low-priority requests are shed, and the
+# page number from which list pages count as low priority.
+CONDUIT_ADMISSION_MAX_INFLIGHT = {
+    "critical": 64,
+    "low": 4,
+    "normal": 16,
+}
+CONDUIT_ADMISSION_MAX_LATENCY = 2.0
+CONDUIT_ADMISSION_LATENCY_DECAY = 10
+CONDUIT_ADMISSION_DEEP_PAGE = 20
+CONDUIT_ADMISSION_RETRY_AFTER = 5
+
+# API requests with a bearer token skip the session, CSRF and message
+# middleware; the browsable API and api/auth/ keep using sessions.
+CONDUIT_API_FAST_PATH = True
+
+# Password hashing pool: worker processes (None for one per core, 0 to hash
+# in the request worker), calls allowed to wait for a free process, how long
+# they wait (s) before a 503, and the Retry-After (s) sent with it.
+CONDUIT_PASSWORD_WORKERS = None
+CONDUIT_PASSWORD_QUEUE_SIZE = 32
+CONDUIT_PASSWORD_QUEUE_TIMEOUT = 2
+CONDUIT_PASSWORD_RETRY_AFTER = 1
+
+# Bulk user creation: most users per request and rows per INSERT.
+CONDUIT_PROVISION_MAX_USERS = 1000
+CONDUIT_PROVISION_BATCH_SIZE = 500